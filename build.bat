@@ -12,5 +12,7 @@ nuitka ^
   --include-data-dir=configs=configs ^
   --include-data-dir=media=media ^
   --include-package=screens ^
+  --include-package=debloat_components ^
+  --include-package=preinstall_components ^
   talon.py
 pause
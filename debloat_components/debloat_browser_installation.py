@@ -6,6 +6,9 @@ import subprocess
 from utilities.util_logger import logger
 from utilities.util_error_popup import show_error_popup
 from utilities.util_powershell_handler import run_powershell_command
+from utilities.util_bundle import active_bundle
+from utilities.util_download_handler import DownloadItem, download_many
+from utilities.util_script_manifest import load_manifest, verify_file
 
 
 
@@ -23,6 +26,24 @@ def load_choice() -> str:
 
 
 
+def _chocolatey_install_command() -> str:
+    """Build the bootstrap command around a verified local install.ps1."""
+    manifest = load_manifest()
+    artifact = manifest.get("chocolatey_install.ps1")
+    if not download_many([DownloadItem(artifact.url, artifact.name, artifact.sha256, artifact.mirrors)]):
+        raise IOError("Failed to download the Chocolatey installer")
+    download_dir = os.path.join(os.environ.get('TEMP', tempfile.gettempdir()), 'talon')
+    installer = os.path.join(download_dir, "chocolatey_install.ps1")
+    verify_file(installer, manifest)
+    cmd = (
+        "Set-ExecutionPolicy Bypass -Scope Process -Force; "
+        "[System.Net.ServicePointManager]::SecurityProtocol = "
+        "[System.Net.ServicePointManager]::SecurityProtocol -bor 3072; "
+    )
+    return cmd + "& '{}'".format(installer.replace("'", "''"))
+
+
+
 def ensure_chocolatey():
     try:
         subprocess.run(
@@ -34,16 +55,15 @@ def ensure_chocolatey():
         logger.info("Chocolatey already installed.")
     except (subprocess.CalledProcessError, FileNotFoundError):
         logger.info("Chocolatey not found. Installing now...")
-        install_cmd = (
-            "Set-ExecutionPolicy Bypass -Scope Process -Force; "
-            "[System.Net.ServicePointManager]::SecurityProtocol = "
-            "[System.Net.ServicePointManager]::SecurityProtocol -bor 3072; "
-            "iex ((New-Object System.Net.WebClient).DownloadString("
-            "'https://community.chocolatey.org/install.ps1'))"
-        )
+        try:
+            install_cmd = _chocolatey_install_command()
+        except Exception as e:
+            logger.error(f"Failed to fetch the Chocolatey installer: {e}")
+            show_error_popup(f"Failed to fetch the Chocolatey installer:\n{e}", allow_continue=False)
+            sys.exit(1)
         logger.info(f"Running install command: {install_cmd}")
         try:
-            run_powershell_command(install_cmd)
+            run_powershell_command(install_cmd, isolate=True)
             logger.info("✔ Chocolatey installed successfully.")
         except Exception as e:
             logger.error(f"Failed to install Chocolatey: {e}")
@@ -92,6 +112,14 @@ def install_browser(pkg_id: str):
 
 
 def main():
+    if active_bundle() is not None:
+        logger.error("Browser installation needs the network; it cannot run from an offline bundle")
+        show_error_popup(
+            "Your browser cannot be installed from an offline bundle:\n"
+            "Chocolatey packages download their installers from the internet.",
+            allow_continue=False
+        )
+        sys.exit(1)
     try:
         pkg_id = load_choice()
         logger.info(f"Browser selected: {pkg_id}")
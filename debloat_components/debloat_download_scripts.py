@@ -2,24 +2,35 @@ import os
 import sys
 import tempfile
 from utilities.util_logger import logger
-from utilities.util_download_handler import download_file
+from utilities.util_download_handler import DownloadItem, download_many
 from utilities.util_error_popup import show_error_popup
+from utilities.util_script_manifest import load_manifest
+
+
+
+SCRIPTS = [
+    "edge_vanisher.ps1",
+    "uninstall_oo.ps1",
+    "update_policy_changer.ps1",
+    "update_policy_changer_pro.ps1",
+]
 
 
 
 def main():
-    scripts = {
-        "edge_vanisher.ps1": "https://code.ravendevteam.org/talon/edge_vanisher.ps1",
-        "uninstall_oo.ps1": "https://code.ravendevteam.org/talon/uninstall_oo.ps1",
-        "update_policy_changer.ps1": "https://code.ravendevteam.org/talon/update_policy_changer.ps1",
-        "update_policy_changer_pro.ps1": "https://code.ravendevteam.org/talon/update_policy_changer_pro.ps1",
-    }
+    try:
+        manifest = load_manifest()
+        scripts = {name: manifest.get(name) for name in SCRIPTS}
+    except Exception as e:
+        logger.error(f"Failed to load script manifest: {e}")
+        show_error_popup(f"Failed to load the script manifest:\n{e}", allow_continue=False)
+        sys.exit(1)
     temp_dir = os.environ.get('TEMP', tempfile.gettempdir())
     download_dir = os.path.join(temp_dir, 'talon')
-    for name, url in scripts.items():
-        logger.info(f"Downloading {url} -> {name}")
-        if not download_file(url, dest_name=name):
-            sys.exit(1)
+    logger.info(f"Downloading {len(scripts)} scripts concurrently")
+    if not download_many(DownloadItem(a.url, a.name, a.sha256, a.mirrors) for a in scripts.values()):
+        sys.exit(1)
+    for name in scripts:
         path = os.path.join(download_dir, name)
         if not os.path.exists(path):
             show_error_popup(
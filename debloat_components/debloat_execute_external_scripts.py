@@ -1,8 +1,31 @@
 import os
 import sys
+import tempfile
 from utilities.util_logger import logger
 from utilities.util_powershell_handler import run_powershell_command
 from utilities.util_error_popup import show_error_popup
+from utilities.util_download_handler import DownloadItem, download_many
+from utilities.util_script_manifest import load_manifest, verify_file
+
+
+
+REMOTE_SCRIPTS = ["winutil.ps1", "win11debloat.ps1"]
+
+
+
+def _fetch_remote_scripts() -> dict:
+    """Download (or take from the bundle) both scripts and return their quoted paths."""
+    manifest = load_manifest()
+    artifacts = [manifest.get(name) for name in REMOTE_SCRIPTS]
+    if not download_many(DownloadItem(a.url, a.name, a.sha256, a.mirrors) for a in artifacts):
+        raise IOError("Failed to download the external debloat scripts")
+    download_dir = os.path.join(os.environ.get('TEMP', tempfile.gettempdir()), 'talon')
+    paths = {}
+    for name in REMOTE_SCRIPTS:
+        path = os.path.join(download_dir, name)
+        verify_file(path, manifest)
+        paths[name] = path.replace("'", "''")
+    return paths
 
 
 
@@ -24,10 +47,23 @@ def main():
             pass
         sys.exit(1)
     logger.info(f"Using WinUtil config: {config_path}")
+    try:
+        scripts = _fetch_remote_scripts()
+    except Exception as e:
+        logger.error(f"Failed to fetch external debloat scripts: {e}")
+        try:
+            show_error_popup(
+                f"Failed to fetch external debloat scripts:\n{e}",
+                allow_continue=False,
+            )
+        except Exception:
+            pass
+        sys.exit(1)
     cmd1 = (
-        f'iex "& {{ $(irm https://christitus.com/win) }} -Config \'{config_path}\' -Run"'
+        f'iex "& {{ $(Get-Content -Raw -LiteralPath \'{scripts["winutil.ps1"]}\') }} '
+        f'-Config \'{config_path}\' -Run"'
     )
-    logger.info("Executing ChrisTitusTech WinUtil via remote command")
+    logger.info("Executing ChrisTitusTech WinUtil")
     try:
         run_powershell_command(
             cmd1,
@@ -65,10 +101,12 @@ def main():
         '-DisableMouseAcceleration',
     ]
     flags = ' '.join(args2)
-    cmd2 = f"& ([scriptblock]::Create((irm \"https://debloat.raphi.re/\"))) {flags}"
-    logger.info("Executing Raphi Win11Debloat via remote command")
+    cmd2 = (
+        f"& ([scriptblock]::Create((Get-Content -Raw -LiteralPath '{scripts['win11debloat.ps1']}'))) {flags}"
+    )
+    logger.info("Executing Raphi Win11Debloat")
     try:
-        run_powershell_command(cmd2)
+        run_powershell_command(cmd2, isolate=True)
         logger.info("Successfully executed Raphi Win11Debloat")
     except Exception as e:
         logger.error(f"Failed to execute Raphi Win11Debloat: {e}")
@@ -13,7 +13,7 @@ def main():
     for script in scripts:
         logger.info(f"Executing PowerShell script: {script}")
         try:
-            run_powershell_script(script)
+            run_powershell_script(script, isolate=True)
             logger.info(f"✔ Successfully executed {script}")
         except Exception as e:
             logger.error(f"✖ Failed to execute {script}: {e}")
@@ -1,56 +1,42 @@
 import sys
-import winreg
 from utilities.util_logger import logger
 from utilities.util_error_popup import show_error_popup
-from utilities.util_modify_registry import set_value
+from utilities.util_modify_registry import apply_diff
+from utilities.util_tweak_catalog import load_catalog, load_tweak_selection
 
 
 
 def main():
-    registry_modifications = [
-        (winreg.HKEY_CURRENT_USER,
-         r"Software\Microsoft\Windows\CurrentVersion\Explorer\Advanced",
-         "TaskbarAl", winreg.REG_DWORD, 0),
-        (winreg.HKEY_CURRENT_USER,
-         r"Software\Microsoft\Windows\CurrentVersion\Themes\Personalize",
-         "AppsUseLightTheme", winreg.REG_DWORD, 0),
-        (winreg.HKEY_CURRENT_USER,
-         r"Software\Microsoft\Windows\CurrentVersion\Themes\Personalize",
-         "SystemUsesLightTheme", winreg.REG_DWORD, 0),
-        (winreg.HKEY_CURRENT_USER,
-         r"Software\Microsoft\Windows\CurrentVersion\GameDVR",
-         "AppCaptureEnabled", winreg.REG_DWORD, 0),
-        (winreg.HKEY_LOCAL_MACHINE,
-         r"SOFTWARE\Microsoft\PolicyManager\default\ApplicationManagement\AllowGameDVR",
-         "Value", winreg.REG_DWORD, 0),
-        (winreg.HKEY_CURRENT_USER,
-         r"Control Panel\Desktop",
-         "MenuShowDelay", winreg.REG_SZ, "0"),
-        (winreg.HKEY_CURRENT_USER,
-         r"Control Panel\Desktop\WindowMetrics",
-         "MinAnimate", winreg.REG_DWORD, 0),
-        (winreg.HKEY_CURRENT_USER,
-         r"Software\Microsoft\Windows\CurrentVersion\Explorer\Advanced",
-         "ExtendedUIHoverTime", winreg.REG_DWORD, 1),
-        (winreg.HKEY_CURRENT_USER,
-         r"Software\Microsoft\Windows\CurrentVersion\Explorer\Advanced",
-         "HideFileExt", winreg.REG_DWORD, 0),
-    ]
-    for hive, key_path, name, value_type, value in registry_modifications:
+    try:
+        catalog = load_catalog()
+        tags, exclude_tags, _ = load_tweak_selection()
+        tweaks = catalog.select(tags, exclude_tags)
+    except Exception as e:
+        logger.error(f"Failed to load registry tweak catalog: {e}")
         try:
-            logger.info(f"Applying registry tweak: {key_path}\\{name} = {value!r} (type={value_type})")
-            set_value(hive, key_path, name, value, value_type)
-            logger.info(f"Successfully set {name}")
-        except Exception as e:
-            logger.error(f"Failed to apply registry tweak {name}: {e}")
-            try:
-                show_error_popup(
-                    f"Failed to apply registry tweak:\n{key_path}\\{name}\n\n{e}",
-                    allow_continue=False
-                )
-            except Exception:
-                pass
-            sys.exit(1)
+            show_error_popup(
+                f"Failed to load registry tweak catalog:\n{e}",
+                allow_continue=False
+            )
+        except Exception:
+            pass
+        sys.exit(1)
+    ops = catalog.to_ops(tweaks)
+    logger.info(f"Applying {len(ops)} registry tweaks")
+    changes = apply_diff(ops)
+    logger.info(f"Registry tweaks: {changes.summary()}")
+    failed = changes.failed
+    if failed:
+        details = "\n".join(f"{r.op.key_path}\\{r.op.name}: {r.error}" for r in failed)
+        logger.error(f"Failed to apply {len(failed)} registry tweaks")
+        try:
+            show_error_popup(
+                f"Failed to apply registry tweaks:\n{details}",
+                allow_continue=False
+            )
+        except Exception:
+            pass
+        sys.exit(1)
 
     logger.info("All registry tweaks applied successfully.")
 
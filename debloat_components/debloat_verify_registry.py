@@ -0,0 +1,45 @@
+import sys
+from utilities.util_logger import logger
+from utilities.util_error_popup import show_error_popup
+from utilities.util_registry_verify import verify_tweaks, reapply_drift
+from utilities.util_tweak_catalog import load_catalog, load_tweak_selection
+
+
+
+def main():
+    try:
+        tags, exclude_tags, reapply = load_tweak_selection()
+        tweaks = load_catalog().select(tags, exclude_tags)
+    except Exception as e:
+        logger.error(f"Failed to load registry tweak catalog: {e}")
+        try:
+            show_error_popup(
+                f"Failed to load registry tweak catalog:\n{e}",
+                allow_continue=False
+            )
+        except Exception:
+            pass
+        sys.exit(1)
+    report = verify_tweaks(tweaks)
+    try:
+        path = report.write()
+        logger.info(f"Registry drift report written to {path}")
+    except Exception as e:
+        logger.error(f"Failed to write registry drift report: {e}")
+    if not report or not reapply:
+        return
+    failed = [r for r in reapply_drift(report) if not r.ok]
+    if failed:
+        details = "\n".join(f"{r.op.key_path}\\{r.op.name}: {r.error}" for r in failed)
+        logger.error(f"Failed to reapply {len(failed)} drifted registry tweaks")
+        show_error_popup(
+            f"Failed to reapply drifted registry tweaks:\n{details}",
+            allow_continue=True
+        )
+        return
+    logger.info("All drifted registry tweaks reapplied.")
+
+
+
+if __name__ == "__main__":
+    main()
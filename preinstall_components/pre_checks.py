@@ -1,35 +1,37 @@
 import os
 import tempfile
-import urllib.request
-import urllib.error
 import subprocess
 from utilities.util_defender_check import ensure_defender_disabled
 from utilities.util_windows_check import check_windows_11_home_or_pro
 from utilities.util_download_handler import download_file
 from utilities.util_error_popup import show_error_popup
 from utilities.util_logger import logger
-from utilities.util_ssl import create_ssl_context
+from utilities.util_powershell_host import HostUnavailableError, get_host, host_enabled
+from utilities.util_system_info import get_system_info
+from utilities.util_script_manifest import load_manifest, verify_file
+from utilities.util_bundle import active_bundle
+from utilities.util_mirror_select import PROBE_TIMEOUT, race_mirrors
 
 
 
-TEST_SCRIPT_URL = "https://code.ravendevteam.org/talon/dry_run_test.ps1"
+TEST_SCRIPT_NAME = "dry_run_test.ps1"
+# A lone origin has no faster mirror to fall back on, so give it as long
+# as the original single-host check did.
+SINGLE_ORIGIN_TIMEOUT = 10.0
 
 
 
-def _check_domain_reachable(url: str) -> bool:
-    ctx = create_ssl_context()
-    try:
-        req = urllib.request.Request(url, method="HEAD")
-        with urllib.request.urlopen(req, timeout=10, context=ctx):
-            return True
-    except Exception as e:
-        logger.error(f"Connectivity check failed for {url}: {e}")
-        show_error_popup(
-            "Talon could not reach code.ravendevteam.org.\n"
-            "Please check your internet connection or contact your ISP.",
-            allow_continue=True,
-        )
-        return False
+def _check_domain_reachable(urls: list) -> bool:
+    timeout = PROBE_TIMEOUT if len(set(urls)) > 1 else SINGLE_ORIGIN_TIMEOUT
+    if race_mirrors(urls, timeout=timeout) is not None:
+        return True
+    logger.error(f"Connectivity check failed for every mirror: {', '.join(urls)}")
+    show_error_popup(
+        "Talon could not reach any of its download servers.\n"
+        "Please check your internet connection or contact your ISP.",
+        allow_continue=True,
+    )
+    return False
 
 
 
@@ -54,8 +56,35 @@ def _check_temp_writable() -> bool:
 
 
 
+def _run_test_script_in_host(script_path: str):
+    if not host_enabled():
+        return None
+    try:
+        result = get_host().run_script(script_path, timeout=30)
+    except HostUnavailableError as e:
+        logger.warning(f"PowerShell host unavailable, spawning a process instead: {e}")
+        return None
+    return result.status, result.output.strip()
+
+
+
 def _run_test_script(script_path: str) -> bool:
+    if not get_system_info().powershell_available:
+        logger.error("Skipping test PowerShell script: PowerShell did not answer the system probe")
+        show_error_popup(
+            "Failed to run test PowerShell script. Powershell may be disabled.",
+            allow_continue=True,
+        )
+        return False
     try:
+        verify_file(script_path)
+        hosted = _run_test_script_in_host(script_path)
+        if hosted is not None:
+            returncode, output = hosted
+            logger.debug(f"Test script output: {output}")
+            if returncode == 0 and "Hello, World!" in output:
+                return True
+            raise RuntimeError(f"test script exited with code {returncode}")
         result = subprocess.run(
             [
                 "powershell.exe",
@@ -89,18 +118,32 @@ def _run_test_script(script_path: str) -> bool:
 
 
 def _download_and_run_test_script() -> bool:
-    if not download_file(TEST_SCRIPT_URL, dest_name="dry_run_test.ps1"):
+    try:
+        artifact = load_manifest().get(TEST_SCRIPT_NAME)
+    except Exception as e:
+        logger.error(f"Failed to load script manifest: {e}")
+        show_error_popup(f"Failed to load the script manifest:\n{e}", allow_continue=True)
+        return False
+    if not download_file(
+        artifact.url, dest_name=artifact.name, sha256=artifact.sha256, mirrors=artifact.mirrors
+    ):
         return False
     temp_root = os.environ.get("TEMP", tempfile.gettempdir())
-    script_path = os.path.join(temp_root, "talon", "dry_run_test.ps1")
+    script_path = os.path.join(temp_root, "talon", artifact.name)
     return _run_test_script(script_path)
 
 
 
 def main() -> None:
+    get_system_info()
     ensure_defender_disabled()
     check_windows_11_home_or_pro()
-    _check_domain_reachable("https://code.ravendevteam.org")
+    if active_bundle() is None:
+        try:
+            artifact = load_manifest().get(TEST_SCRIPT_NAME)
+            _check_domain_reachable([artifact.url, *artifact.mirrors])
+        except Exception as e:
+            logger.error(f"Failed to load script manifest: {e}")
     _check_temp_writable()
     _download_and_run_test_script()
 
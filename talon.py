@@ -1,68 +1,151 @@
 import os
 import subprocess
 import sys
+import tempfile
 import threading
 import argparse
+from importlib import import_module
 from screens import load as load_screen
 from utilities.util_logger import logger
-from utilities.util_error_popup import show_error_popup
-from PyQt5.QtWidgets import QApplication
-from PyQt5.QtCore import QObject, QEvent, QTimer, QMetaObject, Qt, Q_ARG
+from utilities.util_error_popup import show_error_popup, set_headless
 from utilities.util_admin_check import ensure_admin
-import preinstall_components.pre_checks as pre_checks
-import debloat_components.debloat_download_scripts as debloat_download_scripts
-import debloat_components.debloat_execute_raven_scripts as debloat_execute_raven_scripts
-import debloat_components.debloat_execute_external_scripts as debloat_execute_external_scripts
-import debloat_components.debloat_browser_installation as debloat_browser_installation
-import debloat_components.debloat_registry_tweaks as debloat_registry_tweaks
-import debloat_components.debloat_configure_updates as debloat_configure_updates
-import debloat_components.debloat_apply_background as debloat_apply_background
-from ui_components.ui_base_full import UIBaseFull
-from ui_components.ui_header_text import UIHeaderText
-from ui_components.ui_title_text import UITitleText
+from utilities.util_step_scheduler import run_step_graph
+from utilities.util_step_journal import StepJournal
+from utilities.util_trace import enable_tracing, span, write_chrome_trace
+from utilities.util_profile import load_profile, save_browser_choice, ConsoleProgress
+from utilities.util_output_capture import set_spill_dir
+from utilities.util_registry_journal import RegistryJournal, set_active_journal, rollback
+from utilities.util_modify_registry import set_backend, flush_key_cache
+from utilities.util_tweak_catalog import default_catalog_path, load_catalog, save_tweak_selection
+from utilities.util_script_manifest import default_manifest_path
+from utilities.util_bundle import Bundle, build_bundle, set_active_bundle
 
 
 
+def _lazy_main(module_name: str):
+    def _run():
+        import_module(f"debloat_components.{module_name}").main()
+    return _run
+
+
+
+# Mostly a chain on purpose: each step changes system state that the next
+# one must see or override (apps removed before a browser is installed,
+# third-party debloaters before Talon's own registry tweaks, the tweaks'
+# wallpaper settings before the background is set). Only configure-updates
+# can overlap registry-tweaks and verify-registry.
 DEBLOAT_STEPS = [
     (
         "download-scripts",
         "Downloading some necessary scripts... (1/8)",
-        debloat_download_scripts.main,
+        _lazy_main("debloat_download_scripts"),
+        [],
+        [],
     ),
     (
         "execute-raven-scripts",
         "Executing debloating scripts... (2/8)",
-        debloat_execute_raven_scripts.main,
+        _lazy_main("debloat_execute_raven_scripts"),
+        ["download-scripts"],
+        [],
     ),
     (
         "browser-installation",
         "Installing your chosen browser... (3/8)",
-        debloat_browser_installation.main,
+        _lazy_main("debloat_browser_installation"),
+        ["execute-raven-scripts"],
+        [],
     ),
     (
         "execute-external-scripts",
         "Debloating Windows... (4/8)",
-        debloat_execute_external_scripts.main,
+        _lazy_main("debloat_execute_external_scripts"),
+        ["browser-installation"],
+        [],
     ),
     (
         "registry-tweaks",
-        "Making some visual tweaks... (6/8)",
-        debloat_registry_tweaks.main,
+        "Making some visual tweaks... (5/8)",
+        _lazy_main("debloat_registry_tweaks"),
+        ["execute-external-scripts"],
+        [],
+    ),
+    (
+        "verify-registry",
+        "Verifying registry tweaks... (6/8)",
+        _lazy_main("debloat_verify_registry"),
+        ["registry-tweaks", "execute-external-scripts"],
+        [],
     ),
     (
         "configure-updates",
         "Configuring Windows Update policies... (7/8)",
-        debloat_configure_updates.main,
+        _lazy_main("debloat_configure_updates"),
+        ["download-scripts", "execute-external-scripts"],
+        [],
     ),
     (
         "apply-background",
         "Setting your desktop background... (8/8)",
-        debloat_apply_background.main,
+        _lazy_main("debloat_apply_background"),
+        ["registry-tweaks", "verify-registry", "configure-updates"],
+        [],
     ),
 ]
 
 
 
+# Steps that only act on what another step did in the same session. When
+# the other step is skipped (by flag, profile or --resume) they do nothing:
+# verifying tweaks that were never applied would report them all as drift,
+# and --reapply-drift would then write the tweaks the user chose to skip.
+STEP_REQUIRES = {
+    "verify-registry": ["registry-tweaks"],
+}
+
+
+
+def _step_inputs(slug: str) -> list:
+    if getattr(sys, 'frozen', False):
+        base_path = os.path.dirname(sys.executable)
+    else:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    download_dir = os.path.join(os.environ.get('TEMP', tempfile.gettempdir()), 'talon')
+    inputs = {
+        "download-scripts": [default_manifest_path()] + [
+            os.path.join(download_dir, name)
+            for name in import_module("debloat_components.debloat_download_scripts").SCRIPTS
+        ],
+        "execute-raven-scripts": [
+            os.path.join(download_dir, "edge_vanisher.ps1"),
+            os.path.join(download_dir, "uninstall_oo.ps1"),
+        ],
+        "browser-installation": [
+            os.path.join(download_dir, "browser_choice.json"),
+        ],
+        "execute-external-scripts": [
+            os.path.join(base_path, "configs", "default.json"),
+        ],
+        "registry-tweaks": [
+            default_catalog_path(),
+            os.path.join(download_dir, "tweak_selection.json"),
+        ],
+        "verify-registry": [
+            default_catalog_path(),
+            os.path.join(download_dir, "tweak_selection.json"),
+        ],
+        "configure-updates": [
+            os.path.join(download_dir, "update_policy_changer.ps1"),
+            os.path.join(download_dir, "update_policy_changer_pro.ps1"),
+        ],
+        "apply-background": [
+            os.path.join(base_path, "media", "desktop_background.png"),
+        ],
+    }
+    return inputs.get(slug, [])
+
+
+
 def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Talon installer")
     parser.add_argument(
@@ -70,7 +153,61 @@ def parse_args(argv=None):
         action="store_true",
         help="Run without the installing overlay",
     )
-    for slug, _, _ in DEBLOAT_STEPS:
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="Run unattended from a JSON profile, without any Qt screens",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=None,
+        help="Maximum number of debloat steps to run at the same time",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip steps the journal records as completed with unchanged inputs",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="Write a Chrome trace-event JSON of step, PowerShell, download and registry spans to FILE",
+    )
+    parser.add_argument(
+        "--output-spill-dir",
+        metavar="DIR",
+        help="Write the raw output of every child process to files in DIR",
+    )
+    parser.add_argument(
+        "--registry-backend",
+        choices=["winreg", "regfile"],
+        default=None,
+        help="Write registry tweaks through live API calls (default) or one batched reg import",
+    )
+    parser.add_argument(
+        "--reapply-drift",
+        action="store_true",
+        help="Rewrite registry tweaks that the verification step finds drifted",
+    )
+    parser.add_argument(
+        "--rollback-registry",
+        nargs="?",
+        const="",
+        metavar="JOURNAL",
+        help="Restore every registry value recorded in the registry journal and exit",
+    )
+    parser.add_argument(
+        "--bundle",
+        metavar="PACK",
+        help="Take every script and installer from an offline bundle instead of the network",
+    )
+    parser.add_argument(
+        "--build-bundle",
+        metavar="PACK",
+        help="Download every script and installer into an offline bundle and exit",
+    )
+    for slug, *_ in DEBLOAT_STEPS:
         dest = f"skip_{slug.replace('-', '_')}_step"
         parser.add_argument(
             f"--skip-{slug}-step",
@@ -119,6 +256,11 @@ def run_screen(module_name: str):
 
 def _build_install_ui():
     """Create the installation window and return (app, status_label)."""
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import QObject, QEvent
+    from ui_components.ui_base_full import UIBaseFull
+    from ui_components.ui_header_text import UIHeaderText
+    from ui_components.ui_title_text import UITitleText
     app = QApplication.instance() or QApplication(sys.argv)
     base = UIBaseFull()
     for overlay in base.overlays:
@@ -160,10 +302,11 @@ def _build_install_ui():
 
 
 
-def _update_status(label: UIHeaderText, message: str):
+def _update_status(label, message: str):
     if label is None:
         print(message)
     else:
+        from PyQt5.QtCore import QMetaObject, Qt, Q_ARG
         QMetaObject.invokeMethod(
             label,
             "setText",
@@ -173,33 +316,148 @@ def _update_status(label: UIHeaderText, message: str):
 
 
 
+def _skipped_steps(args) -> list:
+    return [
+        slug for slug, *_ in DEBLOAT_STEPS
+        if getattr(args, f"skip_{slug.replace('-', '_')}_step")
+    ]
+
+
+
+def _traced_step(slug: str, func):
+    def _run():
+        try:
+            with span(slug, "step"):
+                func()
+        finally:
+            flush_key_cache()
+    return _run
+
+
+
 def main(argv=None):
     args = parse_args(argv)
+    if args.trace:
+        enable_tracing()
+    if args.output_spill_dir:
+        set_spill_dir(args.output_spill_dir)
+    if args.registry_backend:
+        set_backend(args.registry_backend)
+    if args.build_bundle:
+        try:
+            build_bundle(args.build_bundle)
+        except Exception as e:
+            logger.error(f"Failed to build bundle {args.build_bundle}: {e}")
+            print(f"Failed to build bundle {args.build_bundle}: {e}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+    if args.bundle:
+        try:
+            set_active_bundle(Bundle(args.bundle))
+        except Exception as e:
+            logger.error(f"Invalid bundle {args.bundle}: {e}")
+            print(f"Invalid bundle {args.bundle}: {e}", file=sys.stderr)
+            sys.exit(1)
+    profile = None
+    if args.profile:
+        set_headless(True)
+        try:
+            profile = load_profile(args.profile, [slug for slug, *_ in DEBLOAT_STEPS])
+            load_catalog().select(profile["tweak_tags"], profile["skip_tweak_tags"])
+        except Exception as e:
+            logger.error(f"Invalid profile {args.profile}: {e}")
+            print(f"Invalid profile {args.profile}: {e}", file=sys.stderr)
+            sys.exit(1)
+        for slug in profile["skip_steps"]:
+            setattr(args, f"skip_{slug.replace('-', '_')}_step", True)
+    if args.bundle and "browser-installation" not in _skipped_steps(args):
+        # Chocolatey browser packages download their installers themselves,
+        # so refuse before anything is changed rather than at step 3.
+        msg = (
+            "Offline bundle mode cannot install a browser: Chocolatey packages download "
+            "their installers from the internet. Add --skip-browser-installation-step "
+            "(or skip it in the profile) to run from a bundle."
+        )
+        logger.error(msg)
+        print(msg, file=sys.stderr)
+        sys.exit(1)
     ensure_admin()
-    pre_checks.main()
-    run_screen('screen_browser_select')
-    run_screen('screen_donation_request')
+    if args.rollback_registry is not None:
+        results = rollback(args.rollback_registry or RegistryJournal())
+        sys.exit(1 if any(not r.ok for r in results) else 0)
+    set_active_journal(RegistryJournal())
+    import_module("preinstall_components.pre_checks").main()
     app = None
     status_label = None
-    if not args.developer_mode:
-        app, status_label = _build_install_ui()
+    progress = None
+    # Final skip set: CLI flags plus profile skip_steps, already folded in.
+    skipped = _skipped_steps(args)
+    if profile is not None:
+        save_browser_choice(profile["browser"])
+        save_tweak_selection(
+            profile["tweak_tags"],
+            profile["skip_tweak_tags"],
+            args.reapply_drift or profile["reapply_drift"],
+        )
+        args.resume = args.resume or profile["resume"]
+        if args.max_workers is None:
+            args.max_workers = profile["max_workers"]
+        progress = ConsoleProgress(len(DEBLOAT_STEPS) - len(skipped))
+    else:
+        save_tweak_selection(None, reapply_drift=args.reapply_drift)
+        run_screen('screen_browser_select')
+        run_screen('screen_donation_request')
+        if not args.developer_mode:
+            app, status_label = _build_install_ui()
 
-    def debloat_sequence():
-        for slug, message, func in DEBLOAT_STEPS:
-            if getattr(args, f"skip_{slug.replace('-', '_')}_step"):
-                logger.info(f"Skipping {slug} step")
-                continue
+    def _on_start(slug, message):
+        if progress is not None:
+            progress.start(slug, message)
+        else:
             _update_status(status_label, message)
-            try:
-                func()
-            except Exception:
-                return
+
+    def debloat_sequence():
+        journal = StepJournal(resume=args.resume)
+        steps = [
+            (
+                slug,
+                message,
+                journal.wrap(
+                    slug,
+                    _traced_step(slug, func),
+                    lambda s=slug: _step_inputs(s),
+                    requires=STEP_REQUIRES.get(slug, ()),
+                ),
+                deps,
+                conflicts,
+            )
+            for slug, message, func, deps, conflicts in DEBLOAT_STEPS
+        ]
+        try:
+            succeeded = run_step_graph(
+                steps,
+                max_workers=args.max_workers or 2,
+                skip=skipped,
+                weights=journal.durations(),
+                on_start=_on_start,
+                on_finish=progress.finish if progress is not None else None,
+            )
+        finally:
+            if args.trace:
+                write_chrome_trace(args.trace)
+        if not succeeded:
+            return
+        if profile is not None and not profile["reboot"]:
+            logger.info("Profile disables the final restart; exiting")
+            return
         _update_status(status_label, "Restarting system…")
         subprocess.call(["shutdown", "/r", "/t", "0"])
 
-    if args.developer_mode:
+    if app is None:
         debloat_sequence()
     else:
+        from PyQt5.QtCore import QTimer
+
         def start_thread():
             threading.Thread(target=debloat_sequence, daemon=True).start()
         QTimer.singleShot(0, start_thread)
@@ -0,0 +1,40 @@
+from utilities.util_output_matcher import OutputMatcher, OutputPattern, SUCCESS, TERMINATE
+
+
+
+def _fired(patterns, *chunks):
+    scanner = OutputMatcher(patterns).scanner()
+    return [(p.pattern, p.action) for chunk in chunks for p, _ in scanner.feed(chunk)]
+
+
+
+def test_nested_literals_both_fire():
+    patterns = [OutputPattern("Tweaks are Finished", TERMINATE), OutputPattern("Finished", SUCCESS)]
+    assert _fired(patterns, "Tweaks are Finished\n") == [
+        ("Tweaks are Finished", TERMINATE),
+        ("Finished", SUCCESS),
+    ]
+
+
+
+def test_overlapping_literals_both_fire():
+    patterns = [OutputPattern("abc", SUCCESS), OutputPattern("bcd", TERMINATE)]
+    assert _fired(patterns, "abcd") == [("abc", SUCCESS), ("bcd", TERMINATE)]
+
+
+
+def test_overlapping_literals_split_across_chunks():
+    patterns = [OutputPattern("abc", SUCCESS), OutputPattern("bcd", TERMINATE)]
+    assert _fired(patterns, "ab", "cd") == [("abc", SUCCESS), ("bcd", TERMINATE)]
+
+
+
+def test_literal_is_reported_once_across_chunks():
+    patterns = [OutputPattern("done", SUCCESS)]
+    assert _fired(patterns, "all done", " and more") == [("done", SUCCESS)]
+
+
+
+def test_ignore_case_only_applies_to_its_own_literal():
+    patterns = [OutputPattern("ERROR", TERMINATE, ignore_case=True), OutputPattern("Done", SUCCESS)]
+    assert _fired(patterns, "error: done") == [("ERROR", TERMINATE)]
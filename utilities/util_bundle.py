@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from typing import Iterable, Optional
+from utilities.util_logger import logger
+from utilities.util_script_manifest import Artifact, check_digest, file_sha256, load_manifest
+
+
+
+# Layout: magic, little-endian u32 index length, UTF-8 JSON index, then
+# every member back to back. Offsets in the index are relative to the end
+# of the index, so a member is one seek and one bounded read away.
+BUNDLE_MAGIC = b"TALONPK1"
+BUNDLE_VERSION = 1
+_HEADER = struct.Struct("<8sI")
+BundleMember = namedtuple("BundleMember", ["name", "url", "sha256", "offset", "size"])
+_active = None
+_active_lock = threading.Lock()
+
+
+
+class BundleMissError(LookupError):
+    pass
+
+
+
+class _MemberReader:
+    """A file positioned at one member that stops at its end."""
+
+    def __init__(self, f, size: int):
+        self._f = f
+        self._remaining = size
+
+    def readinto(self, buffer) -> int:
+        if self._remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:self._remaining]
+        n = self._f.readinto(view)
+        if not n:
+            raise IOError(f"Bundle ended {self._remaining} bytes early")
+        self._remaining -= n
+        return n
+
+
+
+class Bundle:
+    """Read-only view of a pack built by build_bundle."""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        with open(self.path, 'rb') as f:
+            magic, index_size = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != BUNDLE_MAGIC:
+                raise ValueError(f"{path} is not a Talon bundle")
+            index = json.loads(f.read(index_size).decode('utf-8'))
+        if index.get('version') != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported bundle version: {index.get('version')!r}")
+        self.data_offset = _HEADER.size + index_size
+        self.created = index.get('created')
+        self.members = [BundleMember(**m) for m in index['members']]
+        self.by_url = {m.url: m for m in self.members}
+        self.by_sha256 = {m.sha256: m for m in self.members}
+        self.by_name = {m.name.lower(): m for m in self.members}
+
+    def __len__(self):
+        return len(self.members)
+
+    def find(self, url: str, sha256: Optional[str] = None, name: Optional[str] = None) -> BundleMember:
+        """Look a payload up by pinned digest, then URL, then file name."""
+        member = self.by_sha256.get(sha256) if sha256 else None
+        member = member or self.by_url.get(url)
+        member = member or (self.by_name.get(name.lower()) if name else None)
+        if member is None:
+            raise BundleMissError(f"{url} is not in bundle {self.path}")
+        return member
+
+    def extract(self, member: BundleMember, dest_path: str, sinks: Iterable = ()) -> str:
+        """Copy one member to dest_path and return its verified sha256."""
+        from utilities.util_download_handler import atomic_replace, stream_to_file
+        digest = hashlib.sha256()
+        tmp_path = f"{dest_path}.part"
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self.data_offset + member.offset)
+                stream_to_file(_MemberReader(f, member.size), tmp_path, sinks=[digest.update, *sinks])
+            check_digest(member.name, member.sha256, digest.hexdigest())
+            atomic_replace(tmp_path, dest_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return member.sha256
+
+
+
+def set_active_bundle(bundle: Optional[Bundle]) -> None:
+    global _active
+    with _active_lock:
+        _active = bundle
+    if bundle is not None:
+        logger.info(f"Offline mode: serving {len(bundle)} payloads from {bundle.path}")
+
+
+
+def active_bundle() -> Optional[Bundle]:
+    return _active
+
+
+
+def build_bundle(out_path: str, artifacts: Optional[Iterable[Artifact]] = None) -> Bundle:
+    """Download every manifest artifact and pack them into out_path."""
+    from utilities.util_download_handler import DownloadItem, _download_dir, download_many
+    artifacts = list(artifacts if artifacts is not None else load_manifest().artifacts)
+    if not download_many(DownloadItem(a.url, a.name, a.sha256, a.mirrors) for a in artifacts):
+        raise IOError("Failed to download every payload for the bundle")
+    staged = [os.path.join(_download_dir(), a.name) for a in artifacts]
+    members = []
+    offset = 0
+    for artifact, path in zip(artifacts, staged):
+        size = os.path.getsize(path)
+        members.append(BundleMember(artifact.name, artifact.url, file_sha256(path), offset, size)._asdict())
+        offset += size
+    index = json.dumps(
+        {'version': BUNDLE_VERSION, 'created': time.time(), 'members': members},
+        separators=(',', ':'),
+    ).encode('utf-8')
+    tmp_path = f"{out_path}.part"
+    with open(tmp_path, 'wb') as out:
+        out.write(_HEADER.pack(BUNDLE_MAGIC, len(index)))
+        out.write(index)
+        for path in staged:
+            with open(path, 'rb') as src:
+                shutil.copyfileobj(src, out, 1024 * 1024)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, out_path)
+    logger.info(f"Wrote bundle {out_path}: {len(members)} payloads, {offset} bytes")
+    return Bundle(out_path)
+
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2 or argv[0] not in ("build", "list"):
+        print("usage: python -m utilities.util_bundle {build|list} PACK")
+        return 2
+    bundle = build_bundle(argv[1]) if argv[0] == "build" else Bundle(argv[1])
+    for member in bundle.members:
+        print(f"{member.name}: {member.size} bytes  {member.sha256}  {member.url}")
+    return 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,10 @@
 import sys
-import subprocess
 import threading
-import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from utilities.util_logger import logger
 from utilities.util_error_popup import show_error_popup
+from utilities.util_process_runner import run_process
+from utilities.util_output_capture import OutputCapture
 
 
 
@@ -15,8 +15,6 @@ class ScriptProcessHandler:
         self.max_workers = max_workers
         self.stop_on_error = stop_on_error
         self._cancel_event = threading.Event()
-        self._processes = []
-        self._lock = threading.Lock()
 
     def add_script(self, script_path: str):
         self.scripts.append(script_path)
@@ -37,7 +35,6 @@ class ScriptProcessHandler:
                 if self.stop_on_error:
                     logger.info("Cancelling remaining scripts...")
                     self._cancel_event.set()
-                    self._terminate_all_processes()
                 raise
         if self._cancel_event.is_set():
             raise RuntimeError("Execution aborted due to earlier error")
@@ -48,56 +45,24 @@ class ScriptProcessHandler:
             return
         logger.info(f"Launching script: {script_path}")
         cmd = [sys.executable, script_path]
-        try:
-            proc = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1
-            )
-        except Exception as e:
-            logger.exception(f"Failed to start process for {script_path}: {e}")
-            raise
-        with self._lock:
-            self._processes.append(proc)
-        def _log_stream(pipe, log_fn, prefix):
-            for line in iter(pipe.readline, ''):
-                log_fn(f"{script_path} {prefix}: {line.rstrip()}")
-            pipe.close()
-        out_thread = threading.Thread(
-            target=_log_stream, args=(proc.stdout, logger.info, "STDOUT"), daemon=True
-        )
-        err_thread = threading.Thread(
-            target=_log_stream, args=(proc.stderr, logger.error, "STDERR"), daemon=True
-        )
-        out_thread.start()
-        err_thread.start()
-        while proc.poll() is None:
-            if self._cancel_event.is_set():
-                logger.warning(
-                    f"Terminating script due to cancellation: {script_path} (pid={proc.pid})"
-                )
-                proc.terminate()
-                break
-        out_thread.join()
-        err_thread.join()
-        returncode = proc.returncode or 0
+        with OutputCapture(script_path) as capture:
+            try:
+                result = run_process(cmd, on_output=capture.line, cancel_event=self._cancel_event)
+            except Exception as e:
+                logger.exception(f"Failed to start process for {script_path}: {e}")
+                raise
+        if result.cancelled:
+            logger.warning(f"Terminated script due to cancellation: {script_path}")
+        returncode = result.returncode or 0
         if returncode != 0:
             logger.error(f"{script_path} exited with code {returncode}")
-            show_error_popup(f"Script '{script_path}' failed with exit code {returncode}", allow_continue=False)
+            show_error_popup(
+                f"Script '{script_path}' failed with exit code {returncode}\n\n"
+                f"Last output:\n{capture.tail_text()}",
+                allow_continue=False,
+            )
             raise RuntimeError(f"{script_path} failed (exit code {returncode})")
 
-    def _terminate_all_processes(self):
-        with self._lock:
-            for proc in self._processes:
-                if proc.poll() is None:
-                    try:
-                        logger.warning(f"Force-killing process pid={proc.pid}")
-                        proc.terminate()
-                    except Exception as e:
-                        logger.error(f"Error terminating pid={proc.pid}: {e}")
-
 
 
 def run_scripts_threaded(script_paths: list, max_workers: int = None):
@@ -1,40 +1,17 @@
-import json
 import os
-import subprocess
-from utilities.util_powershell_handler import run_powershell_command
-import sys
+from utilities.util_powershell_handler import run_powershell_batch
+from utilities.util_system_info import get_system_info, record_defender_exclusions
 from utilities.util_logger import logger
 from utilities.util_error_popup import show_error_popup
 
 
+
 def _get_defender_exclusions() -> list[str]:
-    cmd = [
-        "powershell.exe",
-        "-NoProfile",
-        "-Command",
-        "Get-MpPreference | ConvertTo-Json -Compress",
-    ]
-    creationflags = 0
-    if sys.platform == "win32":
-        creationflags = subprocess.CREATE_NEW_PROCESS_GROUP
-        if hasattr(subprocess, "CREATE_NO_WINDOW"):
-            creationflags |= subprocess.CREATE_NO_WINDOW
-    try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=True,
-            creationflags=creationflags,
-        )
-        data = json.loads(result.stdout)
-        paths = data.get("ExclusionPath") or []
-        if isinstance(paths, str):
-            paths = [paths]
-        return [os.path.normpath(p).rstrip("\\") for p in paths]
-    except Exception as e:
-        logger.exception(f"Failed to query Defender exclusions: {e}")
-        raise
+    info = get_system_info()
+    if info.defender_exclusions is None:
+        logger.error(f"Failed to query Defender exclusions: {info.defender_error}")
+        raise RuntimeError(info.defender_error or "Defender state unknown")
+    return info.defender_exclusions
 
 
 
@@ -81,29 +58,65 @@ def is_path_excluded(path: str) -> bool:
 
 
 
-def add_defender_exclusion(path: str) -> None:
-    norm = os.path.normpath(path).rstrip("\\")
-    if is_path_excluded(norm):
-        logger.debug(f"Path already excluded in Defender: {norm}")
+def _exclusion_failed(norms: list[str], e: Exception) -> None:
+    logger.error(f"Failed to add Defender exclusions {norms}: {e}")
+    show_error_popup(
+        "Failed to add Windows Defender exclusions:\n" + "\n".join(norms) + f"\n{e}",
+        allow_continue=True,
+    )
+
+
+
+def add_defender_exclusions(paths: list[str]) -> None:
+    norms = [os.path.normpath(p).rstrip("\\") for p in paths]
+    if not norms:
         return
+    # Query the current exclusions first so Add-MpPreference only runs, in
+    # one batch, for the paths that are actually missing.
     try:
-        logger.info(f"Adding Defender exclusion for {norm}")
-        run_powershell_command(
-            f"Add-MpPreference -ExclusionPath '{norm}'",
-            allow_continue_on_fail=True,
-        )
-        logger.info(f"Added Defender exclusion for {norm}")
-    except SystemExit:
-        pass
+        current = run_powershell_batch(["(Get-MpPreference).ExclusionPath"])[0]
+    except Exception as e:
+        _exclusion_failed(norms, e)
+        return
+    existing = {
+        os.path.normpath(line.strip()).rstrip("\\").lower()
+        for line in current.output.splitlines() if line.strip()
+    }
+    added = [norm for norm in norms if norm.lower() in existing]
+    for norm in added:
+        logger.debug(f"Path already excluded in Defender: {norm}")
+    missing = [norm for norm in norms if norm.lower() not in existing]
+    try:
+        results = run_powershell_batch([
+            "Add-MpPreference -ExclusionPath '{}'".format(norm.replace("'", "''"))
+            for norm in missing
+        ])
     except Exception as e:
-        logger.error(f"Failed to add Defender exclusion {norm}: {e}")
+        record_defender_exclusions(added)
+        _exclusion_failed(missing, e)
+        return
+    failed = []
+    for norm, result in zip(missing, results):
+        if result.success:
+            logger.info(f"Added Defender exclusion for {norm} ({result.elapsed_ms:.0f} ms)")
+            added.append(norm)
+        else:
+            logger.error(f"Failed to add Defender exclusion {norm}: {result.error}")
+            failed.append(f"{norm}\n{result.error}")
+    record_defender_exclusions(added)
+    if failed:
         show_error_popup(
-            f"Failed to add Windows Defender exclusion:\n{norm}\n{e}",
+            "Failed to add Windows Defender exclusion:\n" + "\n".join(failed),
             allow_continue=True,
         )
 
 
 
+def add_defender_exclusion(path: str) -> None:
+    add_defender_exclusions([path])
+
+
+
 if __name__ == "__main__":
     ensure_defender_disabled()
     print("C: drive exclusion detected. Continuing…")
@@ -0,0 +1,195 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional
+from utilities.util_logger import logger
+
+
+
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+
+def _default_root() -> str:
+    temp_dir = os.environ.get('TEMP', tempfile.gettempdir())
+    return os.path.join(temp_dir, 'talon', 'cache')
+
+
+
+def cache_enabled() -> bool:
+    return os.environ.get("TALON_DOWNLOAD_CACHE", "1") != "0"
+
+
+
+def _link_or_copy(src: str, dest: str) -> None:
+    tmp_path = f"{dest}.part"
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dest)
+
+
+
+class DownloadCache:
+    """Content-addressed store of downloaded files.
+
+    Objects live under objects/<sha256[:2]>/<sha256>. index.json maps each
+    URL to its object plus the ETag/Last-Modified validators from the last
+    200 response, and tracks object sizes and last use for LRU eviction.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root or _default_root()
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.root, 'index.json')
+        self._lock = threading.Lock()
+        self._index = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION:
+                return data
+            logger.warning(f"Ignoring download cache index with unknown version: {data.get('version')!r}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable download cache index {self.index_path}: {e}")
+        return {'version': CACHE_VERSION, 'urls': {}, 'objects': {}}
+
+    def _flush(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.root, 'objects', sha256[:2], sha256)
+
+    def _valid_entry(self, url: str) -> Optional[dict]:
+        entry = self._index['urls'].get(url)
+        if not entry:
+            return None
+        if not os.path.isfile(self.object_path(entry['sha256'])):
+            self._index['urls'].pop(url, None)
+            self._index['objects'].pop(entry['sha256'], None)
+            return None
+        return entry
+
+    def conditional_headers(self, url: str) -> dict:
+        with self._lock:
+            entry = self._valid_entry(url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def has_object(self, sha256: str) -> bool:
+        return os.path.isfile(self.object_path(sha256))
+
+    def materialize(self, url: str, dest_path: str) -> Optional[str]:
+        """Place the cached copy of url at dest_path; returns its sha256."""
+        with self._lock:
+            entry = self._valid_entry(url)
+            if entry is None:
+                return None
+            sha256 = entry['sha256']
+            self._index['objects'].setdefault(sha256, {'size': entry.get('size', 0)})['last_used'] = time.time()
+            try:
+                self._flush()
+            except Exception as e:
+                logger.warning(f"Failed to update download cache index: {e}")
+        _link_or_copy(self.object_path(sha256), dest_path)
+        return sha256
+
+    def materialize_object(self, sha256: str, dest_path: str) -> bool:
+        """Place a known object at dest_path without consulting any URL."""
+        if not self.has_object(sha256):
+            return False
+        with self._lock:
+            meta = self._index['objects'].get(sha256)
+            if meta is not None:
+                meta['last_used'] = time.time()
+        _link_or_copy(self.object_path(sha256), dest_path)
+        return True
+
+    def forget(self, sha256: str) -> None:
+        with self._lock:
+            try:
+                os.remove(self.object_path(sha256))
+            except OSError:
+                pass
+            self._index['objects'].pop(sha256, None)
+            for url in [u for u, e in self._index['urls'].items() if e['sha256'] == sha256]:
+                del self._index['urls'][url]
+
+    def store(self, url: str, path: str, sha256: str, size: int, headers=None) -> None:
+        """Record a freshly downloaded file; path stays where it is."""
+        obj = self.object_path(sha256)
+        if not os.path.isfile(obj):
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            _link_or_copy(path, obj)
+        headers = headers or {}
+        with self._lock:
+            self._index['objects'][sha256] = {'size': size, 'last_used': time.time()}
+            self._index['urls'][url] = {
+                'sha256': sha256,
+                'size': size,
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+            }
+            self._evict()
+            self._flush()
+
+    def _evict(self) -> None:
+        objects = self._index['objects']
+        total = sum(meta.get('size', 0) for meta in objects.values())
+        if total <= self.max_bytes:
+            return
+        for sha256, meta in sorted(objects.items(), key=lambda item: item[1].get('last_used', 0)):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.object_path(sha256))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to evict cached object {sha256}: {e}")
+                continue
+            total -= meta.get('size', 0)
+            del objects[sha256]
+            for url in [u for u, e in self._index['urls'].items() if e['sha256'] == sha256]:
+                del self._index['urls'][url]
+            logger.debug(f"Evicted cached object {sha256} ({meta.get('size', 0)} bytes)")
+
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+
+def get_cache() -> Optional[DownloadCache]:
+    global _cache
+    if not cache_enabled():
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = DownloadCache()
+        return _cache
@@ -1,53 +1,461 @@
+import hashlib
 import os
 import tempfile
-import urllib.error
+import threading
+import time
 import urllib.parse
-import urllib.request
-from .util_ssl import create_ssl_context
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
 from utilities.util_logger import logger
 from utilities.util_error_popup import show_error_popup
+from utilities.util_bundle import active_bundle
+from utilities.util_download_cache import get_cache
+from utilities.util_http_pool import HttpError, get_pool
+from utilities.util_mirror_select import get_stats, order_mirrors
+from utilities.util_script_manifest import IntegrityError, check_digest, file_sha256, mark_verified
+from utilities.util_retry_policy import BudgetExceededError, RetryPolicy, get_breaker, is_retriable
+from utilities.util_trace import span, traced
 
 
 
-def download_file(
-    url: str, dest_name: str | None = None, retries: int = 3
-) -> bool:
+DownloadItem = namedtuple(
+    "DownloadItem", ["url", "dest_name", "sha256", "mirrors"], defaults=(None, None, ())
+)
+MAX_PARALLEL_DOWNLOADS = 8
+CHUNK_SIZE = 64 * 1024
+
+
+
+def _download_dir() -> str:
     temp_dir = os.environ.get('TEMP', tempfile.gettempdir())
-    download_dir = os.path.join(temp_dir, 'talon')
+    return os.path.join(temp_dir, 'talon')
+
+
+
+def _filename_for(url: str, dest_name: Optional[str]) -> str:
+    if dest_name is not None:
+        return dest_name
+    filename = os.path.basename(urllib.parse.urlparse(url).path)
+    if not filename:
+        raise ValueError("No filename found in URL path")
+    return filename
+
+
+
+class DownloadProgress:
+    """Aggregate byte and file counts across concurrent downloads."""
+
+    def __init__(self, files_total: int, callback: Optional[Callable[[int, int, int, int], None]] = None):
+        self.files_total = files_total
+        self.files_done = 0
+        self.bytes_done = 0
+        self.bytes_total = 0
+        self.callback = callback
+        self._lock = threading.Lock()
+
+    def expect(self, nbytes: int) -> None:
+        with self._lock:
+            self.bytes_total += nbytes
+
+    def advance(self, nbytes: int, file_done: bool = False) -> None:
+        with self._lock:
+            self.bytes_done += nbytes
+            if file_done:
+                self.files_done += 1
+            snapshot = (self.bytes_done, self.bytes_total, self.files_done, self.files_total)
+        if file_done:
+            logger.info(
+                f"Downloaded {snapshot[2]}/{snapshot[3]} files "
+                f"({snapshot[0] / 1024:.1f} KiB of {snapshot[1] / 1024:.1f} KiB announced)"
+            )
+        if self.callback is not None:
+            self.callback(*snapshot)
+
+
+
+def stream_to_file(
+    source,
+    dest_path: str,
+    chunk_size: int = CHUNK_SIZE,
+    sinks: Iterable[Callable[[bytes], None]] = (),
+    append: bool = False,
+) -> int:
+    """Copy a readable source to dest_path in fixed-size chunks.
+
+    Every chunk is also passed to each sink (hashers, progress, ...) as a
+    memoryview that is only valid during the call, so memory stays flat
+    regardless of payload size. With append=True the
+    bytes are added to an existing file, which is what a resumed transfer
+    needs. Returns the number of bytes copied in this call.
+    """
+    sinks = list(sinks)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    copied = 0
+    with open(dest_path, "ab" if append else "wb") as out_file:
+        while True:
+            n = source.readinto(buffer)
+            if not n:
+                break
+            chunk = view[:n]
+            out_file.write(chunk)
+            for sink in sinks:
+                sink(chunk)
+            copied += n
+        out_file.flush()
+        os.fsync(out_file.fileno())
+    return copied
+
+
+
+def atomic_replace(tmp_path: str, dest_path: str) -> None:
+    os.replace(tmp_path, dest_path)
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(dest_path) or ".", os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+
+def _parse_content_range(value: Optional[str]) -> tuple:
+    """Return (start, total) from a "bytes start-end/total" header; total may be None."""
     try:
-        os.makedirs(download_dir, exist_ok=True)
-    except Exception as e:
-        logger.error(f"Failed to create download directory {download_dir}: {e}")
-        show_error_popup(f"Failed to create download directory:\n{e}", allow_continue=True)
-        return False
-    if dest_name is None:
+        unit, _, spec = (value or "").partition(" ")
+        span_part, _, total = spec.partition("/")
+        if unit != "bytes":
+            raise ValueError(unit)
+        start = int(span_part.partition("-")[0])
+        return start, None if total == "*" else int(total)
+    except ValueError:
+        raise IOError(f"Malformed Content-Range: {value!r}")
+
+
+
+def _resume_validator(headers) -> Optional[str]:
+    # If-Range only accepts a strong ETag or a date.
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+
+class _PartialDownload:
+    """The .part file of one download, kept across attempts so they can resume.
+
+    offset and digest advance together with every chunk written, so a
+    dropped connection leaves them describing exactly what is on disk.
+    """
+
+    def __init__(self, dest_path: str, deadline: Optional[float] = None,
+                 progress: Optional[DownloadProgress] = None):
+        self.tmp_path = f"{dest_path}.part"
+        self.deadline = deadline
+        self.progress = progress
+        self.digest = hashlib.sha256()
+        self.offset = 0
+        self.announced = 0
+        self.validator = None
+        self.discard()
+
+    def advance(self, chunk) -> None:
+        self.digest.update(chunk)
+        self.offset += len(chunk)
+        if self.progress is not None:
+            self.progress.advance(len(chunk))
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceededError(f"Time budget ran out after {self.offset} bytes")
+
+    def announce(self, total: int) -> None:
+        if self.progress is not None:
+            self.progress.expect(total - self.announced)
+        self.announced = total
+
+    def resumable(self) -> bool:
+        if not self.offset or not self.validator:
+            return False
         try:
-            parsed = urllib.parse.urlparse(url)
-            filename = os.path.basename(parsed.path)
-            if not filename:
-                raise ValueError("No filename found in URL path")
-        except Exception as e:
-            logger.error(f"Could not determine filename from URL {url}: {e}")
-            show_error_popup(
-                f"Could not determine filename from URL:\n{url}\n{e}",
-                allow_continue=True,
-            )
+            return os.path.getsize(self.tmp_path) == self.offset
+        except OSError:
             return False
+
+    def discard(self) -> None:
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+        if self.progress is not None and (self.offset or self.announced):
+            self.progress.advance(-self.offset)
+            self.progress.expect(-self.announced)
+        self.digest = hashlib.sha256()
+        self.offset = 0
+        self.announced = 0
+        self.validator = None
+
+
+
+def _finish(dest_path: str, sha256: str, progress: Optional[DownloadProgress]) -> None:
+    mark_verified(dest_path, sha256)
+    if progress is not None:
+        progress.advance(0, file_done=True)
+
+
+
+def _fetch(url: str, dest_path: str, partial: _PartialDownload, expected_sha256: Optional[str] = None) -> None:
+    # The body goes to a sibling .part file that only replaces dest_path once
+    # it is complete, on disk and matches its pinned digest, so a failed or
+    # tampered transfer never leaves a script where a later step would run
+    # it. The .part file is left for the next attempt to resume with Range.
+    name = os.path.basename(dest_path)
+    cache = get_cache()
+    if cache is not None and expected_sha256 and cache.materialize_object(expected_sha256, dest_path):
+        # The store lives in %TEMP%; a local re-hash is cheap next to
+        # trusting it blindly with a script that runs elevated.
+        if file_sha256(dest_path) == expected_sha256:
+            logger.info(f"Using cached {name} by its pinned SHA-256 {expected_sha256[:12]}")
+            _finish(dest_path, expected_sha256, partial.progress)
+            return
+        logger.warning(f"Cached object for {name} is corrupt; downloading it again")
+        os.remove(dest_path)
+        cache.forget(expected_sha256)
+    if partial.resumable():
+        headers = {"Range": f"bytes={partial.offset}-", "If-Range": partial.validator}
     else:
-        filename = dest_name
-    dest_path = os.path.join(download_dir, filename)
-    ssl_context = create_ssl_context()
-    for attempt in range(1, retries + 1):
+        partial.discard()
+        headers = cache.conditional_headers(url) if cache is not None else {}
+    try:
+        response = get_pool().open(url, headers=headers)
+    except HttpError as e:
+        if e.status != 416 or "Range" not in headers:
+            raise
+        logger.info(f"Server rejected resuming {url} at byte {partial.offset}; starting over")
+        partial.discard()
+        response = get_pool().open(url)
+    with response:
+        if response.status == 304 and cache is not None:
+            response.read()
+            indexed = cache.materialize(url, dest_path)
+            if indexed is None:
+                raise IOError(f"Server answered 304 but the cached copy of {url} is gone")
+            # Same as the pinned-object path: re-hash rather than trust the
+            # index, since _finish marks the file verified for verify_file.
+            sha256 = file_sha256(dest_path)
+            if sha256 != indexed:
+                os.remove(dest_path)
+                cache.forget(indexed)
+                raise IOError(f"Cached copy of {url} is corrupt; downloading it again")
+            try:
+                check_digest(name, expected_sha256, sha256)
+            except IntegrityError:
+                os.remove(dest_path)
+                raise
+            logger.info(f"Not modified, reused cached copy of {url} ({sha256[:12]})")
+            _finish(dest_path, sha256, partial.progress)
+            return
+        if response.status == 206 and partial.offset:
+            start, expected = _parse_content_range(response.headers.get("Content-Range"))
+            if start != partial.offset:
+                partial.discard()
+                raise IOError(f"Server resumed at byte {start} instead of {partial.offset}")
+            logger.info(f"Resuming {url} at byte {start}")
+        else:
+            if partial.offset:
+                logger.info(f"Server sent the whole body of {url} again; starting over")
+                partial.discard()
+            partial.validator = _resume_validator(response.headers)
+            length = response.headers.get("Content-Length")
+            expected = int(length) if length is not None else None
+        if expected is not None:
+            partial.announce(expected)
+        stream_to_file(response, partial.tmp_path, sinks=[partial.advance], append=partial.offset > 0)
+    if expected is not None and partial.offset != expected:
+        raise IOError(f"Truncated body: got {partial.offset} of {expected} bytes")
+    sha256 = partial.digest.hexdigest()
+    try:
+        check_digest(name, expected_sha256, sha256)
+    except IntegrityError:
+        partial.discard()
+        raise
+    atomic_replace(partial.tmp_path, dest_path)
+    if cache is not None:
         try:
-            logger.info(f"Attempt {attempt}/{retries}: Downloading {url} to {dest_path}")
-            with urllib.request.urlopen(url, context=ssl_context) as response, open(dest_path, "wb") as out_file:
-                out_file.write(response.read())
+            cache.store(url, dest_path, sha256, partial.offset, response.headers)
+        except Exception as e:
+            logger.warning(f"Failed to cache {url}: {e}")
+    _finish(dest_path, sha256, partial.progress)
+
+
+
+def _extract_from_bundle(bundle, url: str, dest_path: str, sha256: Optional[str],
+                         progress: Optional[DownloadProgress]) -> None:
+    name = os.path.basename(dest_path)
+    member = bundle.find(url, sha256, name)
+    check_digest(name, sha256, member.sha256)
+    sinks = []
+    if progress is not None:
+        progress.expect(member.size)
+        sinks.append(lambda chunk: progress.advance(len(chunk)))
+    bundle.extract(member, dest_path, sinks)
+    logger.info(f"Extracted {member.name} from bundle to {dest_path}")
+    _finish(dest_path, member.sha256, progress)
+
+
+
+def _fetch_with_retries(
+    url: str,
+    dest_path: str,
+    policy: Optional[RetryPolicy] = None,
+    progress: Optional[DownloadProgress] = None,
+    sha256: Optional[str] = None,
+) -> None:
+    bundle = active_bundle()
+    if bundle is not None:
+        _extract_from_bundle(bundle, url, dest_path, sha256, progress)
+        return
+    policy = policy or RetryPolicy()
+    breaker = get_breaker()
+    host = urllib.parse.urlsplit(url).hostname or url
+    deadline = time.monotonic() + policy.budget
+    partial = _PartialDownload(dest_path, deadline, progress)
+    try:
+        for attempt in range(1, policy.attempts + 1):
+            breaker.before_request(host)
+            before = partial.offset
+            resume_note = f" (resuming at byte {before})" if partial.resumable() else ""
+            logger.info(f"Attempt {attempt}/{policy.attempts}: Downloading {url} to {dest_path}{resume_note}")
+            try:
+                _fetch(url, dest_path, partial, sha256)
+            except Exception as e:
+                retriable = is_retriable(e)
+                # A host that answered or made progress before dropping is
+                # flaky, not down; only dead attempts count against it.
+                if retriable and partial.offset <= before:
+                    breaker.record_failure(host)
+                else:
+                    breaker.record_success(host)
+                if not retriable or attempt == policy.attempts:
+                    logger.error(f"Failed to download {url} after {attempt} attempts: {e}")
+                    raise
+                delay = policy.backoff(attempt)
+                if time.monotonic() + delay > deadline:
+                    logger.error(f"Failed to download {url}: {policy.budget:.0f}s budget spent")
+                    raise BudgetExceededError(f"Gave up after {attempt} attempts: {e}") from e
+                logger.warning(f"Download attempt {attempt} failed: {e}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            breaker.record_success(host)
             logger.info(f"Successfully downloaded {url} to {dest_path}")
-            return True
+            return
+    finally:
+        if os.path.exists(partial.tmp_path):
+            partial.discard()
+
+
+
+def _fetch_from_mirrors(
+    urls: list,
+    dest_path: str,
+    policy: Optional[RetryPolicy] = None,
+    progress: Optional[DownloadProgress] = None,
+    sha256: Optional[str] = None,
+) -> None:
+    """Try the mirrors fastest first, moving on when one is exhausted."""
+    if len(urls) < 2 or active_bundle() is not None:
+        _fetch_with_retries(urls[0], dest_path, policy, progress, sha256)
+        return
+    ordered = order_mirrors(urls)
+    for position, url in enumerate(ordered, 1):
+        try:
+            _fetch_with_retries(url, dest_path, policy, progress, sha256)
+            return
         except Exception as e:
-            logger.warning(f"Download attempt {attempt} failed: {e}")
-            if attempt == retries:
-                logger.error(f"Failed to download {url} after {retries} attempts")
-                show_error_popup(f"Failed to download:\n{url}\nafter {retries} attempts", allow_continue=True)
-                return False
-    return False
+            get_stats().record_failure(url)
+            if position == len(ordered):
+                raise
+            logger.warning(f"Mirror {url} failed ({e}); trying {ordered[position]}")
+        finally:
+            get_stats().flush()
+
+
+
+def _prepare_dir() -> Optional[str]:
+    download_dir = _download_dir()
+    try:
+        os.makedirs(download_dir, exist_ok=True)
+    except Exception as e:
+        logger.error(f"Failed to create download directory {download_dir}: {e}")
+        show_error_popup(f"Failed to create download directory:\n{e}", allow_continue=True)
+        return None
+    return download_dir
+
+
+
+@traced("download", "network", lambda url, *a, **k: {"url": url})
+def download_file(
+    url: str,
+    dest_name: str | None = None,
+    policy: Optional[RetryPolicy] = None,
+    sha256: Optional[str] = None,
+    mirrors: Iterable[str] = (),
+) -> bool:
+    download_dir = _prepare_dir()
+    if download_dir is None:
+        return False
+    try:
+        filename = _filename_for(url, dest_name)
+    except Exception as e:
+        logger.error(f"Could not determine filename from URL {url}: {e}")
+        show_error_popup(
+            f"Could not determine filename from URL:\n{url}\n{e}",
+            allow_continue=True,
+        )
+        return False
+    dest_path = os.path.join(download_dir, filename)
+    try:
+        _fetch_from_mirrors([url, *mirrors], dest_path, policy, sha256=sha256)
+    except Exception as e:
+        show_error_popup(f"Failed to download:\n{url}\n{e}", allow_continue=True)
+        return False
+    return True
+
+
+
+def download_many(
+    items: Iterable[DownloadItem],
+    policy: Optional[RetryPolicy] = None,
+    max_workers: int = MAX_PARALLEL_DOWNLOADS,
+    on_progress: Optional[Callable[[int, int, int, int], None]] = None,
+) -> bool:
+    """Download items concurrently over the shared connection pool.
+
+    The pool caps requests per host; failures are reported in one popup.
+    """
+    items = [DownloadItem(*item) for item in items]
+    download_dir = _prepare_dir()
+    if download_dir is None:
+        return False
+    progress = DownloadProgress(len(items), on_progress)
+    failed = []
+
+    def _one(item: DownloadItem) -> None:
+        with span("download", "network", url=item.url):
+            try:
+                dest_path = os.path.join(download_dir, _filename_for(item.url, item.dest_name))
+                _fetch_from_mirrors([item.url, *item.mirrors], dest_path, policy, progress, item.sha256)
+            except Exception as e:
+                failed.append(f"{item.url}\n{e}")
+
+    with span("download.batch", "network", files=len(items)):
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items) or 1)),
+                                thread_name_prefix="download") as pool:
+            list(pool.map(_one, items))
+    if failed:
+        show_error_popup(
+            f"Failed to download {len(failed)} of {len(items)} files:\n" + "\n".join(failed),
+            allow_continue=True,
+        )
+        return False
+    return True
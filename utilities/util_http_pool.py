@@ -0,0 +1,224 @@
+import atexit
+import http.client
+import threading
+import urllib.parse
+import urllib.request
+from typing import Optional
+from utilities.util_logger import logger
+from utilities.util_ssl import get_ssl_context
+
+
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_PER_HOST = 4
+MAX_REDIRECTS = 5
+USER_AGENT = "Talon"
+
+
+
+class HttpError(OSError):
+
+    def __init__(self, url: str, status: int, reason: str):
+        super().__init__(f"HTTP {status} {reason} for {url}")
+        self.url = url
+        self.status = status
+
+
+
+class PooledResponse:
+    """An http.client response that hands its connection back when closed."""
+
+    def __init__(self, pool, key, conn, response, url: str):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        return self._response.read(amt)
+
+    def readinto(self, buffer) -> int:
+        return self._response.readinto(buffer)
+
+    def close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        reusable = self._response.isclosed() and not self._response.will_close
+        self._response.close()
+        self._pool._release(self._key, conn, reusable)
+
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections shared by every download.
+
+    Idle connections are kept per (scheme, host, port) and one cached SSL
+    context is used for all of them. A per-host semaphore bounds how many
+    requests run against the same host at once.
+    """
+
+    def __init__(self, per_host: int = DEFAULT_PER_HOST, timeout: float = DEFAULT_TIMEOUT):
+        self.per_host = per_host
+        self.timeout = timeout
+        self._idle = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def _slot(self, key) -> threading.Semaphore:
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = threading.BoundedSemaphore(self.per_host)
+            return slot
+
+    def _new_connection(self, scheme: str, host: str, port: int):
+        proxy = None
+        if not urllib.request.proxy_bypass(host):
+            proxy = urllib.request.getproxies().get(scheme)
+        if proxy:
+            proxy_url = urllib.parse.urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+            target = (proxy_url.hostname, proxy_url.port or 8080)
+        else:
+            target = (host, port)
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(*target, timeout=self.timeout, context=get_ssl_context())
+            if proxy:
+                conn.set_tunnel(host, port)
+        else:
+            conn = http.client.HTTPConnection(*target, timeout=self.timeout)
+        conn._talon_proxied = bool(proxy) and scheme == "http"
+        self.opened += 1
+        return conn
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.reused += 1
+                return idle.pop()
+        return self._new_connection(*key)
+
+    def _release(self, key, conn, reusable: bool) -> None:
+        try:
+            if reusable:
+                self._set_timeout(conn, self.timeout)
+                with self._lock:
+                    self._idle.setdefault(key, []).append(conn)
+            else:
+                conn.close()
+        finally:
+            self._slot(key).release()
+
+    @staticmethod
+    def _set_timeout(conn, timeout: float) -> None:
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+
+    def _request_once(self, method: str, url: str, headers: dict, timeout: Optional[float] = None):
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Unsupported URL: {url}")
+        key = (scheme, parts.hostname, parts.port or (443 if scheme == "https" else 80))
+        path = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "identity", **headers}
+        self._slot(key).acquire()
+        conn = None
+        try:
+            # A pooled connection may have been closed by the server while
+            # idle; retry once on a fresh one before giving up. ConnectionError
+            # covers RemoteDisconnected, resets, broken pipes and the
+            # WSAECONNABORTED Windows raises for such a socket.
+            for fresh in (False, True):
+                conn = self._new_connection(*key) if fresh else self._acquire(key)
+                if timeout is not None:
+                    self._set_timeout(conn, timeout)
+                target = url if conn._talon_proxied else path
+                try:
+                    conn.request(method, target, headers=headers)
+                    response = conn.getresponse()
+                    break
+                except ConnectionError:
+                    conn.close()
+                    if fresh:
+                        raise
+        except BaseException:
+            if conn is not None:
+                conn.close()
+            self._slot(key).release()
+            raise
+        if method == "HEAD":
+            response.read()
+        return PooledResponse(self, key, conn, response, url)
+
+    def open(
+        self,
+        url: str,
+        method: str = "GET",
+        headers: Optional[dict] = None,
+        timeout: Optional[float] = None,
+    ) -> PooledResponse:
+        """Send a request, following redirects. Error statuses raise HttpError.
+
+        timeout overrides the pool's socket timeout for this request only.
+        The caller must close the response (or use it as a context manager)
+        to hand the connection back.
+        """
+        headers = dict(headers or {})
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._request_once(method, url, headers, timeout)
+            if response.status in (301, 302, 303, 307, 308):
+                location = response.headers.get("Location")
+                response.read()
+                response.close()
+                if not location:
+                    raise HttpError(url, response.status, "redirect without Location")
+                url = urllib.parse.urljoin(url, location)
+                if response.status == 303:
+                    method = "GET"
+                continue
+            if response.status >= 400:
+                response.read()
+                response.close()
+                raise HttpError(url, response.status, response.reason)
+            return response
+        raise HttpError(url, 310, f"more than {MAX_REDIRECTS} redirects")
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+        if self.opened:
+            logger.debug(f"HTTP pool closed: {self.opened} connections opened, {self.reused} reused")
+
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+            atexit.register(_pool.close)
+        return _pool
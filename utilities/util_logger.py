@@ -43,7 +43,8 @@ def setup_logger(
         filename=log_file,
         maxBytes=max_bytes,
         backupCount=backup_count,
-        encoding='utf-8'
+        encoding='utf-8',
+        delay=True
     )
     fh.setLevel(level)
     handlers.append(fh)
@@ -83,4 +84,22 @@ def setup_logger(
 
 
 
-logger = setup_logger()
\ No newline at end of file
+class _LazyLogger:
+
+    def __init__(self):
+        self._logger = None
+        self._lock = threading.Lock()
+
+    def _get(self) -> logging.Logger:
+        if self._logger is None:
+            with self._lock:
+                if self._logger is None:
+                    self._logger = setup_logger()
+        return self._logger
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+
+logger = _LazyLogger()
\ No newline at end of file
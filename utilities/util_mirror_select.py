@@ -0,0 +1,198 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from typing import Iterable, List, Optional
+from utilities.util_http_pool import HttpError, get_pool
+from utilities.util_logger import logger
+from utilities.util_retry_policy import get_breaker
+
+
+
+STATS_VERSION = 1
+PROBE_TIMEOUT = 3.0
+EWMA_ALPHA = 0.3
+UNKNOWN_LATENCY = 1.0
+FAILURE_PENALTY = 5.0
+FAILURE_MEMORY = 24 * 3600
+_selected = {}
+_selected_lock = threading.Lock()
+
+
+
+def _stats_path() -> str:
+    temp_dir = os.environ.get('TEMP', tempfile.gettempdir())
+    return os.path.join(temp_dir, 'talon', 'mirror_stats.json')
+
+
+
+def mirror_origin(url: str) -> str:
+    parts = urllib.parse.urlsplit(url)
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+
+
+
+class MirrorStats:
+    """Per-origin probe latency (EWMA) and recent failures, kept across runs.
+
+    Lower scores are tried first: the smoothed latency plus a penalty for
+    every failure within FAILURE_MEMORY. Origins never seen score as
+    UNKNOWN_LATENCY, so a new mirror gets probed before a failing one.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or _stats_path()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._origins = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == STATS_VERSION:
+                return data.get('origins', {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable mirror stats {self.path}: {e}")
+        return {}
+
+    def score(self, url: str) -> float:
+        with self._lock:
+            entry = self._origins.get(mirror_origin(url))
+        if entry is None:
+            return UNKNOWN_LATENCY
+        failures = entry.get('failures', 0)
+        if time.time() - entry.get('last_failure', 0) > FAILURE_MEMORY:
+            failures = 0
+        latency = entry.get('latency')
+        return (UNKNOWN_LATENCY if latency is None else latency) + FAILURE_PENALTY * failures
+
+    def rank(self, urls: Iterable[str]) -> List[str]:
+        return sorted(urls, key=self.score)
+
+    def record_success(self, url: str, latency: float) -> None:
+        with self._lock:
+            entry = self._origins.setdefault(mirror_origin(url), {})
+            previous = entry.get('latency')
+            entry['latency'] = latency if previous is None else previous + EWMA_ALPHA * (latency - previous)
+            entry['failures'] = 0
+            entry['successes'] = entry.get('successes', 0) + 1
+            self._dirty = True
+
+    def record_failure(self, url: str) -> None:
+        with self._lock:
+            entry = self._origins.setdefault(mirror_origin(url), {})
+            entry['failures'] = entry.get('failures', 0) + 1
+            entry['last_failure'] = time.time()
+            self._dirty = True
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {'version': STATS_VERSION, 'origins': self._origins}
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=1)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except OSError as e:
+                logger.warning(f"Failed to save mirror stats: {e}")
+
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+
+def get_stats() -> MirrorStats:
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = MirrorStats()
+            atexit.register(_stats.flush)
+        return _stats
+
+
+
+def _probe(url: str, timeout: float) -> bool:
+    stats = get_stats()
+    start = time.monotonic()
+    try:
+        with get_pool().open(url, method="HEAD", timeout=timeout):
+            pass
+    except HttpError as e:
+        # The mirror answered; it just does not implement HEAD.
+        if e.status not in (405, 501):
+            stats.record_failure(url)
+            logger.debug(f"Mirror probe failed for {url}: {e}")
+            return False
+    except Exception as e:
+        stats.record_failure(url)
+        logger.debug(f"Mirror probe failed for {url}: {e}")
+        return False
+    latency = time.monotonic() - start
+    stats.record_success(url, latency)
+    logger.debug(f"Mirror probe for {url} answered in {latency * 1000:.0f} ms")
+    return True
+
+
+
+def race_mirrors(urls: Iterable[str], timeout: float = PROBE_TIMEOUT) -> Optional[str]:
+    """Probe every mirror at once and return the first healthy one.
+
+    The resulting order (winner first, the rest by score) is remembered
+    for the run, so the download that follows does not probe again.
+    """
+    urls = list(dict.fromkeys(urls))
+    stats = get_stats()
+    breaker = get_breaker()
+    candidates = [u for u in stats.rank(urls) if not breaker.is_open(urllib.parse.urlsplit(u).hostname or u)]
+    winner = None
+    if candidates:
+        executor = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="mirror")
+        futures = {executor.submit(_probe, url, timeout): url for url in candidates}
+        try:
+            for future in as_completed(futures, timeout=timeout + 1):
+                if future.result():
+                    winner = futures[future]
+                    break
+        except TimeoutError:
+            pass
+        finally:
+            executor.shutdown(wait=False)
+    stats.flush()
+    order = stats.rank(urls)
+    if winner is not None:
+        order.remove(winner)
+        order.insert(0, winner)
+        logger.info(f"Selected mirror {mirror_origin(winner)} out of {len(urls)}")
+    else:
+        logger.warning(f"No mirror answered within {timeout:.0f}s: {', '.join(urls)}")
+    with _selected_lock:
+        _selected[tuple(urls)] = order
+    return winner
+
+
+
+def order_mirrors(urls: Iterable[str]) -> List[str]:
+    """Mirrors in the order a download should try them."""
+    urls = list(dict.fromkeys(urls))
+    if len(urls) < 2:
+        return urls
+    with _selected_lock:
+        order = _selected.get(tuple(urls))
+    if order is None:
+        race_mirrors(urls)
+        with _selected_lock:
+            order = _selected[tuple(urls)]
+    return list(order)
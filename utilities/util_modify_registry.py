@@ -1,36 +1,91 @@
-import winreg
-from typing import Any, Union, Optional
+import os
+import threading
+from typing import Any, List, Union, Optional
 from utilities.util_logger import logger
 from utilities.util_error_popup import show_error_popup
+from utilities.util_trace import traced
+from utilities.util_registry_journal import active_journal
+from utilities.util_registry_backend import (
+    RegistryOp,
+    OpResult,
+    RegistryBackend,
+    KeyHandleCache,
+    create_backend,
+    group_by_key,
+    hive_name as _hive_name,
+    infer_type as _infer_type,
+    op_type,
+    resolve_hive as _resolve_hive,
+)
 
 
 
-VIEW_FLAG = winreg.KEY_WOW64_64KEY if hasattr(winreg, 'KEY_WOW64_64KEY') else 0
-_HIVE_MAPPING = {
-    'HKLM': winreg.HKEY_LOCAL_MACHINE,
-    'HKEY_LOCAL_MACHINE': winreg.HKEY_LOCAL_MACHINE,
-    'HKCU': winreg.HKEY_CURRENT_USER,
-    'HKEY_CURRENT_USER': winreg.HKEY_CURRENT_USER,
-    'HKCR': winreg.HKEY_CLASSES_ROOT,
-    'HKEY_CLASSES_ROOT': winreg.HKEY_CLASSES_ROOT,
-    'HKU': winreg.HKEY_USERS,
-    'HKEY_USERS': winreg.HKEY_USERS,
-    'HKCC': winreg.HKEY_CURRENT_CONFIG,
-    'HKEY_CURRENT_CONFIG': winreg.HKEY_CURRENT_CONFIG,
-}
+_backend = None
+_handles = None
+_backend_lock = threading.Lock()
+KEY_CACHE_SIZE = 64
 
 
 
-def _resolve_hive(hive: Union[str, int]) -> int:
-    if isinstance(hive, int):
-        return hive
-    key = hive.upper()
-    if key in _HIVE_MAPPING:
-        return _HIVE_MAPPING[key]
-    raise ValueError(f"Unknown registry hive: {hive!r}")
+def set_backend(backend: Union[RegistryBackend, str, None]) -> None:
+    """Select the backend by instance or name; None restores the default."""
+    global _backend, _handles
+    if isinstance(backend, str):
+        backend = create_backend(backend)
+    with _backend_lock:
+        if _handles is not None:
+            _handles.flush()
+        _backend = backend
+        _handles = None
 
 
 
+def get_backend() -> RegistryBackend:
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend(os.environ.get("TALON_REGISTRY_BACKEND", "winreg"))
+        return _backend
+
+
+
+def _key_cache() -> KeyHandleCache:
+    global _handles
+    backend = get_backend()
+    with _backend_lock:
+        if _handles is None:
+            _handles = KeyHandleCache(backend, KEY_CACHE_SIZE)
+        return _handles
+
+
+
+def flush_key_cache() -> None:
+    """Close cached key handles; called at step boundaries."""
+    with _backend_lock:
+        handles = _handles
+    if handles is not None:
+        handles.flush()
+
+
+
+def _registry_span_attrs(hive, key_path, name=None, *args, **kwargs) -> dict:
+    attrs = {"hive": hive, "key": key_path}
+    if name is not None:
+        attrs["name"] = name
+    return attrs
+
+
+
+def _journal_prior(journal, backend, key, hive, key_path: str, names: List[str]) -> None:
+    """Record the current state of names under an open key before writing."""
+    journal.record_many(
+        (_hive_name(hive), key_path, name, current)
+        for name, current in zip(names, backend.read_values(key, names))
+    )
+
+
+
+@traced("registry.set_value", "registry", _registry_span_attrs)
 def set_value(
     hive: Union[str, int],
     key_path: str,
@@ -41,17 +96,13 @@ def set_value(
     try:
         hive_const = _resolve_hive(hive)
         if value_type is None:
-            if isinstance(value, int):
-                value_type = winreg.REG_DWORD
-            elif isinstance(value, str):
-                value_type = winreg.REG_SZ
-            elif isinstance(value, bytes):
-                value_type = winreg.REG_BINARY
-            else:
-                raise ValueError(f"Unsupported registry value type: {type(value)}")
-        access = winreg.KEY_WRITE | VIEW_FLAG
-        with winreg.CreateKeyEx(hive_const, key_path, 0, access) as key:
-            winreg.SetValueEx(key, name, 0, value_type, value)
+            value_type = _infer_type(value)
+        backend = get_backend()
+        journal = active_journal()
+        with _key_cache().lease(hive_const, key_path, read=bool(journal), write=True, create=True) as key:
+            if journal:
+                _journal_prior(journal, backend, key, hive, key_path, [name])
+            backend.set_value(key, name, value_type, value)
         logger.info(f"Set registry value: {hive}\\{key_path}\\{name} = {value!r} (type={value_type})")
     except Exception as e:
         logger.exception(f"Error setting registry value {hive}\\{key_path}\\{name}: {e}")
@@ -70,9 +121,8 @@ def get_value(
 ) -> Any:
     try:
         hive_const = _resolve_hive(hive)
-        access = winreg.KEY_READ | VIEW_FLAG
-        with winreg.OpenKey(hive_const, key_path, 0, access) as key:
-            val, _ = winreg.QueryValueEx(key, name)
+        with _key_cache().lease(hive_const, key_path, read=True) as key:
+            val, _ = get_backend().query_value(key, name)
             logger.info(f"Read registry value: {hive}\\{key_path}\\{name} = {val!r}")
             return val
     except FileNotFoundError:
@@ -88,6 +138,7 @@ def get_value(
 
 
 
+@traced("registry.delete_value", "registry", _registry_span_attrs)
 def delete_value(
     hive: Union[str, int],
     key_path: str,
@@ -95,9 +146,12 @@ def delete_value(
 ) -> None:
     try:
         hive_const = _resolve_hive(hive)
-        access = winreg.KEY_WRITE | VIEW_FLAG
-        with winreg.OpenKey(hive_const, key_path, 0, access) as key:
-            winreg.DeleteValue(key, name)
+        backend = get_backend()
+        journal = active_journal()
+        with _key_cache().lease(hive_const, key_path, read=bool(journal), write=True) as key:
+            if journal:
+                _journal_prior(journal, backend, key, hive, key_path, [name])
+            backend.delete_value(key, name)
         logger.info(f"Deleted registry value: {hive}\\{key_path}\\{name}")
     except FileNotFoundError:
         logger.warning(f"Registry value to delete not found: {hive}\\{key_path}\\{name}")
@@ -111,14 +165,14 @@ def delete_value(
 
 
 
+@traced("registry.create_key", "registry", _registry_span_attrs)
 def create_key(
     hive: Union[str, int],
     key_path: str
 ) -> None:
     try:
         hive_const = _resolve_hive(hive)
-        access = winreg.KEY_WRITE | VIEW_FLAG
-        with winreg.CreateKeyEx(hive_const, key_path, 0, access):
+        with _key_cache().lease(hive_const, key_path, write=True, create=True):
             pass
         logger.info(f"Created registry key: {hive}\\{key_path}")
     except Exception as e:
@@ -131,18 +185,15 @@ def create_key(
 
 
 
+@traced("registry.delete_key", "registry", _registry_span_attrs)
 def delete_key(
     hive: Union[str, int],
     key_path: str
 ) -> None:
     try:
         hive_const = _resolve_hive(hive)
-        if hasattr(winreg, 'DeleteKeyEx'):
-            winreg.DeleteKeyEx(hive_const, key_path, VIEW_FLAG, 0)
-        else:
-            parent_path, _, sub_key = key_path.rpartition('\\')
-            with winreg.OpenKey(hive_const, parent_path, 0, winreg.KEY_WRITE | VIEW_FLAG) as parent:
-                winreg.DeleteKey(parent, sub_key)
+        _key_cache().invalidate(hive_const, key_path)
+        get_backend().delete_key(hive_const, key_path)
         logger.info(f"Deleted registry key: {hive}\\{key_path}")
     except FileNotFoundError:
         logger.warning(f"Registry key to delete not found: {hive}\\{key_path}")
@@ -152,4 +203,92 @@ def delete_key(
             f"Failed to delete registry key:\n{hive}\\{key_path}\n\n{e}",
             allow_continue=False
         )
-        raise
\ No newline at end of file
+        raise
+
+
+
+@traced("registry.apply_many", "registry", lambda ops, *a, **k: {"ops": len(ops)})
+def apply_many(ops: List[RegistryOp], record: bool = True) -> List[OpResult]:
+    """Apply set/delete operations, opening each key only once.
+
+    Never shows a popup: every operation gets an OpResult and the caller
+    decides how to report failures. With an active registry journal the
+    prior state of each value is appended to it before the key is written,
+    unless record is False.
+    """
+    results = get_backend().apply(ops, active_journal() if record else None)
+    failed = [r for r in results if not r.ok]
+    for r in failed:
+        logger.error(f"Registry operation failed: {r.op.hive}\\{r.op.key_path}\\{r.op.name}: {r.error}")
+    return results
+
+
+
+class ChangeSet:
+    """Planned operations split by how they compare to the live registry.
+
+    Each entry is (op, current) where current is (value, type) or None.
+    """
+
+    def __init__(self):
+        self.changed = []
+        self.unchanged = []
+        self.missing = []
+        self.results = []
+
+    def to_apply(self) -> List[RegistryOp]:
+        return [op for op, _ in self.changed + self.missing]
+
+    @property
+    def failed(self) -> List[OpResult]:
+        return [r for r in self.results if not r.ok]
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.changed)} changed, {len(self.unchanged)} unchanged, "
+            f"{len(self.missing)} missing"
+        )
+
+
+
+def _same_value(op: RegistryOp, current) -> bool:
+    value, value_type = current
+    return value_type == op_type(op) and value == op.value
+
+
+
+@traced("registry.diff_values", "registry", lambda ops, *a, **k: {"ops": len(ops)})
+def diff_values(ops: List[RegistryOp]) -> ChangeSet:
+    """Read the current value and type behind every operation."""
+    changes = ChangeSet()
+    backend = get_backend()
+    handles = _key_cache()
+    for (hive_const, _), members in group_by_key(ops).items():
+        first = members[0][1]
+        with handles.lease(hive_const, first.key_path, read=True, optional=True) as key:
+            for _, op in members:
+                current = None
+                if key is not None:
+                    try:
+                        current = backend.query_value(key, op.name)
+                    except FileNotFoundError:
+                        current = None
+                if op.action == "delete":
+                    (changes.changed if current is not None else changes.unchanged).append((op, current))
+                elif current is None:
+                    changes.missing.append((op, current))
+                elif _same_value(op, current):
+                    changes.unchanged.append((op, current))
+                else:
+                    changes.changed.append((op, current))
+    logger.info(f"Registry diff: {changes.summary()}")
+    return changes
+
+
+
+def apply_diff(ops: List[RegistryOp]) -> ChangeSet:
+    """Write only the operations whose target differs from the live value."""
+    changes = diff_values(ops)
+    pending = changes.to_apply()
+    changes.results = apply_many(pending) if pending else []
+    return changes
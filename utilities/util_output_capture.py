@@ -0,0 +1,148 @@
+import itertools
+import os
+import re
+import tempfile
+from collections import deque
+from typing import Optional
+from utilities.util_logger import logger
+
+
+
+DEFAULT_TAIL_LINES = 200
+DEFAULT_LOG_LIMIT = 500
+_spill_dir = None
+_spill_counter = itertools.count(1)
+
+
+
+def set_spill_dir(path: Optional[str]) -> None:
+    global _spill_dir
+    _spill_dir = path
+
+
+
+def _overflow_dir() -> str:
+    temp_dir = os.environ.get('TEMP', tempfile.gettempdir())
+    return os.path.join(temp_dir, 'talon', 'output')
+
+
+
+def _spill_path(label: str, directory: Optional[str] = None) -> Optional[str]:
+    directory = directory or _spill_dir
+    if not directory:
+        return None
+    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", label).strip("_") or "output"
+    return os.path.join(directory, f"{safe}-{os.getpid()}-{next(_spill_counter)}.log")
+
+
+
+class OutputCapture:
+    """Per-process sink for child output.
+
+    Keeps a fixed-size tail for error messages, optionally spills every raw
+    line to a file and collapses runs of identical lines. Only the first
+    log_limit lines and every STDERR line reach the logger; once the limit
+    is hit, the rest goes to the spill file, or to an overflow file under
+    %TEMP%/talon/output when no spill file was requested.
+    """
+
+    def __init__(
+        self,
+        label: str,
+        tail_lines: int = DEFAULT_TAIL_LINES,
+        log_limit: Optional[int] = DEFAULT_LOG_LIMIT,
+        spill_path: Optional[str] = None,
+    ):
+        self.label = label
+        self.tail = deque(maxlen=tail_lines)
+        self.log_limit = log_limit
+        self.total = 0
+        self.logged = 0
+        self.suppressed = 0
+        self._last = None
+        self._repeats = 0
+        self.spill_path = spill_path or _spill_path(label)
+        self._spill = None
+        self.overflow_path = None
+        self._overflow = None
+        if self.spill_path:
+            self._spill = self._open(self.spill_path)
+            if self._spill is None:
+                self.spill_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @staticmethod
+    def _open(path: str):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            return open(path, "w", encoding="utf-8", buffering=1024 * 1024)
+        except OSError as e:
+            logger.warning(f"Cannot open output spill file {path}: {e}")
+            return None
+
+    def _overflow_line(self, stream: str, text: str) -> None:
+        if self._spill is None and self.overflow_path is None:
+            self.overflow_path = _spill_path(self.label, _overflow_dir())
+            self._overflow = self._open(self.overflow_path)
+        if self._overflow is not None:
+            self._overflow.write(f"{stream[3:]} {text}\n")
+
+    def _emit(self, stream: str, text: str) -> None:
+        if self.log_limit is not None and self.logged >= self.log_limit:
+            # Past the limit the raw spill, or an overflow file opened now,
+            # holds the output; STDERR lines are still logged as well.
+            self._overflow_line(stream, text)
+            if stream != "STDERR":
+                self.suppressed += 1
+                if self.suppressed == 1:
+                    where = self.spill_path or (self.overflow_path if self._overflow else None)
+                    logger.warning(
+                        f"{self.label}: log limit of {self.log_limit} lines reached"
+                        + (f"; further output in {where}" if where else "")
+                    )
+                return
+        self.logged += 1
+        log_fn = logger.error if stream == "STDERR" else logger.info
+        log_fn(f"{self.label} {stream}: {text}")
+
+    def _flush_repeats(self) -> None:
+        if self._repeats:
+            stream, text = self._last
+            self._emit(stream, f"x{self._repeats} identical lines: {text}")
+            self._repeats = 0
+
+    def line(self, stream: str, text: str) -> bool:
+        self.total += 1
+        self.tail.append(text)
+        if self._spill is not None:
+            self._spill.write(f"{stream[3:]} {text}\n")
+        key = (stream, text)
+        if key == self._last:
+            self._repeats += 1
+            return False
+        self._flush_repeats()
+        self._last = key
+        self._emit(stream, text)
+        return False
+
+    def tail_text(self, lines: int = 15) -> str:
+        return "\n".join(list(self.tail)[-lines:])
+
+    def close(self) -> None:
+        self._flush_repeats()
+        for f in (self._spill, self._overflow):
+            if f is not None:
+                f.close()
+        self._spill = self._overflow = None
+        if self.suppressed or self.spill_path:
+            logger.info(
+                f"{self.label}: {self.total} lines captured, {self.suppressed} not logged"
+                + (f", raw output in {self.spill_path}" if self.spill_path else "")
+                + (f", the rest in {self.overflow_path}" if self.overflow_path and not self.spill_path else "")
+            )
@@ -0,0 +1,100 @@
+import re
+from typing import Iterable, List, Optional, Tuple
+
+
+
+TERMINATE = "terminate"
+SUCCESS = "success"
+FAILURE = "failure"
+PROGRESS = "progress"
+_ACTIONS = {TERMINATE, SUCCESS, FAILURE, PROGRESS}
+
+# How much already scanned text is kept so a pattern split across two reads
+# still matches. Regex patterns are assumed to match within this window.
+DEFAULT_WINDOW = 4096
+
+
+
+class OutputPattern:
+
+    def __init__(self, pattern: str, action: str, regex: bool = False, ignore_case: bool = False):
+        if action not in _ACTIONS:
+            raise ValueError(f"Unknown output pattern action: {action!r}")
+        self.pattern = pattern
+        self.action = action
+        self.regex = regex
+        flags = re.IGNORECASE if ignore_case else 0
+        self.compiled = re.compile(pattern if regex else re.escape(pattern), flags)
+        if action == PROGRESS and not regex:
+            raise ValueError("Progress patterns must be regular expressions")
+
+    def __repr__(self):
+        kind = "regex" if self.regex else "literal"
+        return f"OutputPattern({self.pattern!r}, {self.action!r}, {kind})"
+
+    def value(self, match) -> Optional[float]:
+        if self.action != PROGRESS:
+            return None
+        groups = match.groupdict()
+        raw = groups.get("progress") if "progress" in groups else (match.group(1) if match.re.groups else None)
+        try:
+            return float(raw)
+        except (TypeError, ValueError):
+            return None
+
+
+
+class OutputMatcher:
+    """Compiled set of patterns, shared by one scanner per output stream."""
+
+    def __init__(self, patterns: Iterable[OutputPattern], window: int = DEFAULT_WINDOW):
+        self.patterns = list(patterns)
+        self.window = window
+        self.regexes = [p for p in self.patterns if p.regex]
+        # Literals are searched one by one, so overlapping or nested literals
+        # ("Finished" inside "Tweaks are Finished") each report their match.
+        self.literals = [p for p in self.patterns if not p.regex and p.pattern]
+
+    @classmethod
+    def for_termination(cls, termination_str: Optional[str], patterns: Iterable[OutputPattern] = ()):
+        patterns = list(patterns)
+        if termination_str:
+            patterns.insert(0, OutputPattern(termination_str, TERMINATE))
+        return cls(patterns) if patterns else None
+
+    def scanner(self) -> "StreamScanner":
+        return StreamScanner(self)
+
+
+
+class StreamScanner:
+
+    def __init__(self, matcher: OutputMatcher):
+        self.matcher = matcher
+        self._tail = ""
+
+    def feed(self, text: str) -> List[Tuple[OutputPattern, Optional[float]]]:
+        """Scan a decoded chunk; only matches ending in the new text count."""
+        if not text:
+            return []
+        matcher = self.matcher
+        buffer = self._tail + text
+        new_from = len(self._tail)
+        events = []
+        for pattern in matcher.literals:
+            start = max(0, new_from - len(pattern.pattern) + 1)
+            if pattern.compiled.flags & re.IGNORECASE:
+                for match in pattern.compiled.finditer(buffer, start):
+                    events.append((match.start(), pattern, None))
+                continue
+            position = buffer.find(pattern.pattern, start)
+            while position != -1:
+                events.append((position, pattern, None))
+                position = buffer.find(pattern.pattern, position + len(pattern.pattern))
+        for pattern in matcher.regexes:
+            for match in pattern.compiled.finditer(buffer):
+                if match.end() > new_from and match.end() > match.start():
+                    events.append((match.start(), pattern, pattern.value(match)))
+        events.sort(key=lambda e: e[0])
+        self._tail = buffer[-matcher.window:]
+        return [(pattern, value) for _, pattern, value in events]
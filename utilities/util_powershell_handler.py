@@ -1,15 +1,132 @@
+import base64
+import json
 import os
-import sys
-import subprocess
 import threading
 import tempfile
 import time
-from typing import List, Optional, Sequence, Union
+from collections import namedtuple
+from typing import Callable, List, Optional, Sequence, Union
 from utilities.util_logger import logger
 from utilities.util_error_popup import show_error_popup
+from utilities.util_trace import traced
+from utilities.util_powershell_host import HostRequestError, HostUnavailableError, get_host, host_enabled
+from utilities.util_process_runner import run_process
+from utilities.util_output_matcher import OutputMatcher, OutputPattern, FAILURE, SUCCESS
+from utilities.util_output_capture import OutputCapture
+from utilities.util_script_manifest import IntegrityError, verify_file
 
 
 
+BatchResult = namedtuple("BatchResult", ["command", "success", "output", "error", "elapsed_ms"])
+BATCH_MARKER = "<<TALON-BATCH>>"
+
+# Each command runs in its own try/catch with errors promoted to
+# terminating, so one failing probe never hides the results of the others.
+_BATCH_TEMPLATE = r"""
+$__talon_cmds = [Text.Encoding]::UTF8.GetString([Convert]::FromBase64String('{payload}')) | ConvertFrom-Json
+$__talon_results = New-Object System.Collections.Generic.List[object]
+foreach ($__talon_cmd in $__talon_cmds) {{
+    $__talon_sw = [Diagnostics.Stopwatch]::StartNew()
+    try {{
+        $ErrorActionPreference = 'Stop'
+        $__talon_out = & ([scriptblock]::Create($__talon_cmd)) 2>&1 | Out-String
+        $__talon_results.Add([pscustomobject]@{{
+            success = $true; output = $__talon_out.TrimEnd(); error = $null
+            elapsed_ms = $__talon_sw.Elapsed.TotalMilliseconds
+        }})
+    }} catch {{
+        $__talon_results.Add([pscustomobject]@{{
+            success = $false; output = ''; error = $_.ToString()
+            elapsed_ms = $__talon_sw.Elapsed.TotalMilliseconds
+        }})
+    }} finally {{
+        $ErrorActionPreference = 'Continue'
+    }}
+}}
+Write-Output ('{marker}' + (ConvertTo-Json -InputObject @($__talon_results.ToArray()) -Compress -Depth 3))
+"""
+
+
+
+def _run_in_host(
+    kind: str,
+    target: str,
+    args: Optional[List[str]],
+    capture: OutputCapture,
+) -> Optional[int]:
+    if not host_enabled():
+        return None
+    try:
+        host = get_host()
+        if kind == "script":
+            result = host.run_script(target, args, blocking=False)
+        else:
+            result = host.run_command(target, blocking=False)
+    except HostUnavailableError as e:
+        logger.warning(f"PowerShell host unavailable, spawning a process instead: {e}")
+        return None
+    except HostRequestError as e:
+        # The request already reached the host; running it again could
+        # repeat side effects, so report the failure instead.
+        logger.error(f"PowerShell host failed while running the request: {e}")
+        capture.line("STDERR", str(e))
+        return 1
+    if result is None:
+        logger.debug("PowerShell host busy, spawning a process instead")
+        return None
+    for line in result.output.splitlines():
+        capture.line("STDOUT", line)
+    for line in result.errors.splitlines():
+        capture.line("STDERR", line)
+    return result.status
+
+
+
+def _spawn_powershell(
+    cmd: List[str],
+    capture: OutputCapture,
+    *,
+    monitor_output: bool,
+    termination_str: Optional[str],
+    cancel_event: Optional[threading.Event],
+    allow_continue_on_fail: bool,
+    launch_error: str,
+    patterns: Sequence[OutputPattern] = (),
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> int:
+    matcher = OutputMatcher.for_termination(termination_str if monitor_output else None, patterns)
+    try:
+        result = run_process(
+            cmd,
+            on_output=capture.line,
+            cancel_event=cancel_event,
+            matcher=matcher,
+            on_progress=on_progress,
+        )
+    except Exception as e:
+        logger.exception(f"Failed to start PowerShell process: {e}")
+        show_error_popup(
+            f"{launch_error}\n{e}",
+            allow_continue=allow_continue_on_fail,
+        )
+        raise
+    if result.cancelled:
+        logger.warning("Killed PowerShell due to external cancellation.")
+    rc = result.returncode or 0
+    if result.outcome == FAILURE:
+        logger.error("PowerShell output matched a failure pattern.")
+        rc = rc or 1
+    elif (result.terminated or result.outcome == SUCCESS) and rc != 0:
+        logger.info(
+            f"PowerShell terminated after detecting '{termination_str}'. "
+            f"Treating exit code {rc} as success."
+        )
+        rc = 0
+    return rc
+
+
+
+@traced("powershell.script", "powershell", lambda script, *a, **k: {"script": script})
 def run_powershell_script(
     script: str,
     args: Optional[List[str]] = None,
@@ -18,6 +135,9 @@ def run_powershell_script(
     termination_str: Optional[str] = None,
     cancel_event: Optional[threading.Event] = None,
     allow_continue_on_fail: bool = False,
+    isolate: bool = False,
+    patterns: Sequence[OutputPattern] = (),
+    on_progress: Optional[Callable[[float], None]] = None,
 ) -> int:
     if not os.path.isabs(script):
         temp_dir = os.environ.get('TEMP', tempfile.gettempdir())
@@ -28,82 +148,50 @@ def run_powershell_script(
         msg = f"PowerShell script not found: {script_path}"
         logger.error(msg)
         raise FileNotFoundError(msg)
+    try:
+        verify_file(script_path)
+    except IntegrityError as e:
+        logger.error(f"Refusing to run {script_path}: {e}")
+        raise
     cmd = [
         "powershell.exe",
         "-NoProfile",
         "-ExecutionPolicy", "Bypass",
         "-File", script_path
     ] + (args or [])
-    logger.info(f"Launching PowerShell: {' '.join(cmd)}")
-    try:
-        creationflags = 0
-        if sys.platform == "win32":
-            creationflags = subprocess.CREATE_NEW_PROCESS_GROUP
-            if hasattr(subprocess, "CREATE_NO_WINDOW"):
-                creationflags |= subprocess.CREATE_NO_WINDOW
-        proc = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            bufsize=1,
-            creationflags=creationflags,
-        )
-    except Exception as e:
-        logger.exception(f"Failed to start PowerShell process: {e}")
-        show_error_popup(
-            f"Error launching PowerShell script:\n{e}",
-            allow_continue=allow_continue_on_fail,
-        )
-        raise
-    termination_detected = False
-
-    def _stream(pipe, log_fn, label):
-        nonlocal termination_detected
-        for line in iter(pipe.readline, ""):
-            text = line.rstrip()
-            log_fn(f"PSCRIPT [{os.path.basename(script_path)}] {label}: {text}")
-            if monitor_output and termination_str and termination_str in text:
-                logger.info(f"Termination string '{termination_str}' detected.")
-                termination_detected = True
-                try:
-                    proc.terminate()
-                except Exception:
-                    pass
-                break
-        pipe.close()
-    threads = []
-    for pipe, fn, lbl in (
-        (proc.stdout, logger.info, "STDOUT"),
-        (proc.stderr, logger.error, "STDERR"),
-    ):
-        t = threading.Thread(target=_stream, args=(pipe, fn, lbl), daemon=True)
-        t.start()
-        threads.append(t)
-    while proc.poll() is None:
-        if cancel_event and cancel_event.is_set():
-            logger.warning("Killing PowerShell due to external cancellation.")
-            try:
-                proc.terminate()
-            except Exception:
-                pass
-            break
-        time.sleep(0.1)
-    for t in threads:
-        t.join()
-    rc = proc.returncode or 0
-    if termination_detected and monitor_output and rc != 0:
-        logger.info(
-            f"PowerShell terminated after detecting '{termination_str}'. "
-            f"Treating exit code {rc} as success."
-        )
-        rc = 0
+    with OutputCapture(f"PSCRIPT [{os.path.basename(script_path)}]") as capture:
+        rc = None
+        if not (isolate or monitor_output or patterns or cancel_event):
+            logger.info(f"Running PowerShell script in host: {script_path}")
+            rc = _run_in_host("script", script_path, args, capture)
+        if rc is None:
+            logger.info(f"Launching PowerShell: {' '.join(cmd)}")
+            rc = _spawn_powershell(
+                cmd,
+                capture,
+                monitor_output=monitor_output,
+                termination_str=termination_str,
+                cancel_event=cancel_event,
+                allow_continue_on_fail=allow_continue_on_fail,
+                patterns=patterns,
+                on_progress=on_progress,
+                launch_error="Error launching PowerShell script:",
+            )
+    return _check_script_rc(rc, script_path, allow_continue_on_fail, capture.tail_text())
+
+
+
+def _check_script_rc(
+    rc: int,
+    script_path: str,
+    allow_continue_on_fail: bool,
+    tail: str = "",
+) -> int:
     if rc != 0:
         logger.error(f"PowerShell exited with code {rc}")
         show_error_popup(
-            f"PowerShell script '{os.path.basename(script_path)}' failed (exit code {rc})",
+            f"PowerShell script '{os.path.basename(script_path)}' failed (exit code {rc})"
+            + (f"\n\nLast output:\n{tail}" if tail else ""),
             allow_continue=allow_continue_on_fail,
         )
         raise RuntimeError(
@@ -115,6 +203,7 @@ def run_powershell_script(
 
 
 
+@traced("powershell.command", "powershell", lambda command, *a, **k: {"command": command})
 def run_powershell_command(
     command: Union[str, Sequence[str]],
     *,
@@ -122,6 +211,9 @@ def run_powershell_command(
     termination_str: Optional[str] = None,
     cancel_event: Optional[threading.Event] = None,
     allow_continue_on_fail: bool = False,
+    isolate: bool = False,
+    patterns: Sequence[OutputPattern] = (),
+    on_progress: Optional[Callable[[float], None]] = None,
 ) -> int:
     if not isinstance(command, str):
         command = "".join(command)
@@ -133,82 +225,103 @@ def run_powershell_command(
         "-Command",
         command,
     ]
-    logger.info(f"Launching PowerShell command: {command}")
-    creationflags = 0
-    if sys.platform == "win32":
-        creationflags = subprocess.CREATE_NEW_PROCESS_GROUP
-        if hasattr(subprocess, "CREATE_NO_WINDOW"):
-            creationflags |= subprocess.CREATE_NO_WINDOW
-    try:
-        proc = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            bufsize=1,
-            creationflags=creationflags,
-        )
-    except Exception as e:
-        logger.exception(f"Failed to start PowerShell command: {e}")
-        show_error_popup(
-            f"Error launching PowerShell:\n{e}",
-            allow_continue=allow_continue_on_fail,
-        )
-        raise
-    termination_detected = False
-
-
-
-    def _stream(pipe, log_fn, label):
-        nonlocal termination_detected
-        for line in iter(pipe.readline, ""):
-            text = line.rstrip()
-            log_fn(f"PCOMMAND {label}: {text}")
-            if monitor_output and termination_str and termination_str in text:
-                logger.info(f"Termination string '{termination_str}' detected.")
-                termination_detected = True
-                try:
-                    proc.terminate()
-                except Exception:
-                    pass
-                break
-        pipe.close()
-    threads = []
-    for pipe, fn, lbl in (
-        (proc.stdout, logger.info, "STDOUT"),
-        (proc.stderr, logger.error, "STDERR"),
-    ):
-        t = threading.Thread(target=_stream, args=(pipe, fn, lbl), daemon=True)
-        t.start()
-        threads.append(t)
-    while proc.poll() is None:
-        if cancel_event and cancel_event.is_set():
-            logger.warning("Killing PowerShell due to external cancellation.")
-            try:
-                proc.terminate()
-            except Exception:
-                pass
-            break
-        time.sleep(0.1)
+    with OutputCapture("PCOMMAND") as capture:
+        rc = None
+        if not (isolate or monitor_output or patterns or cancel_event):
+            logger.info(f"Running PowerShell command in host: {command}")
+            rc = _run_in_host("command", command, None, capture)
+        if rc is None:
+            logger.info(f"Launching PowerShell command: {command}")
+            rc = _spawn_powershell(
+                cmd,
+                capture,
+                monitor_output=monitor_output,
+                termination_str=termination_str,
+                cancel_event=cancel_event,
+                allow_continue_on_fail=allow_continue_on_fail,
+                patterns=patterns,
+                on_progress=on_progress,
+                launch_error="Error launching PowerShell:",
+            )
+    return _check_command_rc(rc, allow_continue_on_fail, capture.tail_text())
 
-    for t in threads:
-        t.join()
-    rc = proc.returncode or 0
-    if termination_detected and monitor_output and rc != 0:
-        logger.info(
-            f"PowerShell terminated after detecting '{termination_str}'. "
-            f"Treating exit code {rc} as success."
-        )
-        rc = 0
+
+
+def _check_command_rc(rc: int, allow_continue_on_fail: bool, tail: str = "") -> int:
     if rc != 0:
         logger.error(f"PowerShell exited with code {rc}")
         show_error_popup(
-            f"PowerShell command failed (exit code {rc})",
+            f"PowerShell command failed (exit code {rc})"
+            + (f"\n\nLast output:\n{tail}" if tail else ""),
             allow_continue=allow_continue_on_fail,
         )
         raise RuntimeError(f"PowerShell command failed (code {rc})")
     else:
         logger.debug(f"PowerShell completed successfully (code {rc})")
-    return rc
\ No newline at end of file
+    return rc
+
+
+
+def _parse_batch_output(commands: List[str], output: str) -> List[BatchResult]:
+    for line in reversed(output.splitlines()):
+        if line.startswith(BATCH_MARKER):
+            data = json.loads(line[len(BATCH_MARKER):])
+            break
+    else:
+        raise RuntimeError("PowerShell batch produced no result frame")
+    if isinstance(data, dict):
+        data = [data]
+    if len(data) != len(commands):
+        raise RuntimeError(f"PowerShell batch returned {len(data)} results for {len(commands)} commands")
+    return [
+        BatchResult(
+            command,
+            bool(item.get("success")),
+            item.get("output") or "",
+            item.get("error"),
+            float(item.get("elapsed_ms") or 0.0),
+        )
+        for command, item in zip(commands, data)
+    ]
+
+
+
+@traced("powershell.batch", "powershell", lambda commands, *a, **k: {"commands": len(commands)})
+def run_powershell_batch(commands: Sequence[str]) -> List[BatchResult]:
+    """Run several commands in one PowerShell invocation.
+
+    Returns one BatchResult per command, in order. Only a failure of the
+    invocation itself raises; per-command errors are reported in the results.
+    """
+    commands = list(commands)
+    if not commands:
+        return []
+    payload = base64.b64encode(json.dumps(commands).encode("utf-8")).decode("ascii")
+    script = _BATCH_TEMPLATE.format(payload=payload, marker=BATCH_MARKER)
+    logger.info(f"Running PowerShell batch of {len(commands)} commands")
+    start = time.perf_counter()
+    output = None
+    if host_enabled():
+        try:
+            result = get_host().run_command(script, blocking=False)
+            if result is not None:
+                output = result.output
+        except HostUnavailableError as e:
+            logger.warning(f"PowerShell host unavailable, spawning a process instead: {e}")
+    if output is None:
+        lines = []
+        encoded = base64.b64encode(script.encode("utf-16-le")).decode("ascii")
+        proc = run_process(
+            ["powershell.exe", "-NoProfile", "-ExecutionPolicy", "Bypass", "-EncodedCommand", encoded],
+            on_output=lambda stream, line: lines.append(line) if stream == "STDOUT" else False,
+        )
+        if proc.returncode:
+            logger.warning(f"PowerShell batch process exited with code {proc.returncode}")
+        output = "\n".join(lines)
+    results = _parse_batch_output(commands, output)
+    failed = sum(1 for r in results if not r.success)
+    logger.info(
+        f"PowerShell batch finished in {(time.perf_counter() - start) * 1000:.0f} ms "
+        f"({len(results) - failed} succeeded, {failed} failed)"
+    )
+    return results
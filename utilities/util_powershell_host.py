@@ -0,0 +1,314 @@
+import atexit
+import base64
+import json
+import os
+import queue
+import re
+import subprocess
+import sys
+import threading
+from collections import namedtuple
+from typing import List, Optional, Sequence
+from utilities.util_logger import logger
+
+
+
+HostResult = namedtuple("HostResult", ["status", "output", "errors"])
+FRAME_MARKER = "<<TALON-HOST>>"
+STARTUP_TIMEOUT = 30.0
+REQUEST_TIMEOUT = 600.0
+_BARE_ARG_RE = re.compile(r"^-[A-Za-z][A-Za-z0-9_]*:?$")
+
+
+
+# Raised before a request reached the host (it could not start or its pipe
+# was already closed), so the caller may safely run the work elsewhere.
+class HostUnavailableError(RuntimeError):
+    pass
+
+
+
+# Raised once a request was dispatched (the host exited or timed out while
+# running it). The code may have run in full or in part; never retry it.
+class HostRequestError(RuntimeError):
+    pass
+
+
+
+def quote_arg(arg: str) -> str:
+    """Single-quote an argument for PowerShell, leaving -Parameter names bare."""
+    if _BARE_ARG_RE.match(arg):
+        return arg
+    return "'" + arg.replace("'", "''") + "'"
+
+
+
+# Reads one JSON request per line from stdin and answers each with a single
+# marker-prefixed JSON line, so stray console writes from the executed code
+# can never be mistaken for a response frame.
+_HOST_LOOP = r"""
+$ErrorActionPreference = 'Continue'
+$ProgressPreference = 'SilentlyContinue'
+[Console]::OutputEncoding = New-Object System.Text.UTF8Encoding $false
+$__talon_in = [Console]::In
+[Console]::Out.WriteLine('<<TALON-HOST>>{"id":0,"status":0,"output":"ready","errors":""}')
+[Console]::Out.Flush()
+while ($true) {
+    $__talon_line = $__talon_in.ReadLine()
+    if ($__talon_line -eq $null) { break }
+    $__talon_req = $__talon_line | ConvertFrom-Json
+    $__talon_out = New-Object System.Collections.Generic.List[string]
+    $__talon_err = New-Object System.Collections.Generic.List[string]
+    $__talon_status = 0
+    $global:LASTEXITCODE = 0
+    try {
+        if ($__talon_req.kind -eq 'script') {
+            $__talon_items = & $__talon_req.path 2>&1
+        } else {
+            $__talon_items = & ([scriptblock]::Create($__talon_req.text)) 2>&1
+        }
+        $__talon_ok = $?
+        foreach ($__talon_item in $__talon_items) {
+            if ($__talon_item -is [System.Management.Automation.ErrorRecord]) {
+                $__talon_err.Add($__talon_item.ToString())
+            } else {
+                $__talon_out.Add(($__talon_item | Out-String).TrimEnd())
+            }
+        }
+        if ($LASTEXITCODE) {
+            $__talon_status = $LASTEXITCODE
+        } elseif ((-not $__talon_ok) -and $__talon_req.kind -ne 'script') {
+            $__talon_status = 1
+        }
+    } catch {
+        $__talon_err.Add($_.ToString())
+        $__talon_status = 1
+    }
+    $__talon_resp = @{
+        id = $__talon_req.id
+        status = $__talon_status
+        output = ($__talon_out -join "`n")
+        errors = ($__talon_err -join "`n")
+    } | ConvertTo-Json -Compress
+    [Console]::Out.WriteLine('<<TALON-HOST>>' + $__talon_resp)
+    [Console]::Out.Flush()
+}
+"""
+
+
+
+def _default_host_argv() -> List[str]:
+    encoded = base64.b64encode(_HOST_LOOP.encode("utf-16-le")).decode("ascii")
+    return [
+        "powershell.exe",
+        "-NoProfile",
+        "-NonInteractive",
+        "-ExecutionPolicy", "Bypass",
+        "-EncodedCommand", encoded,
+    ]
+
+
+
+class PowerShellHost:
+
+    def __init__(self, argv: Optional[Sequence[str]] = None):
+        self.argv = list(argv) if argv else _default_host_argv()
+        self._proc = None
+        self._responses = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def _start(self):
+        creationflags = 0
+        if sys.platform == "win32":
+            creationflags = subprocess.CREATE_NEW_PROCESS_GROUP
+            if hasattr(subprocess, "CREATE_NO_WINDOW"):
+                creationflags |= subprocess.CREATE_NO_WINDOW
+        logger.debug(f"Starting persistent PowerShell host: {self.argv[0]}")
+        self._proc = subprocess.Popen(
+            self.argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            bufsize=1,
+            creationflags=creationflags,
+        )
+        self._responses = queue.Queue()
+        threading.Thread(
+            target=self._read_frames, args=(self._proc, self._responses), daemon=True
+        ).start()
+        threading.Thread(target=self._drain_stderr, args=(self._proc,), daemon=True).start()
+        try:
+            ready = self._wait_frame(0, STARTUP_TIMEOUT)
+        except HostRequestError:
+            ready = None
+        if ready is None:
+            self.close()
+            raise HostUnavailableError("PowerShell host did not become ready")
+        logger.info(f"Persistent PowerShell host ready (pid={self._proc.pid})")
+
+    @staticmethod
+    def _read_frames(proc, responses):
+        for line in iter(proc.stdout.readline, ""):
+            line = line.rstrip("\r\n")
+            if line.startswith(FRAME_MARKER):
+                try:
+                    responses.put(("frame", json.loads(line[len(FRAME_MARKER):])))
+                    continue
+                except ValueError:
+                    pass
+            responses.put(("stray", line))
+        responses.put(("eof", None))
+
+    @staticmethod
+    def _drain_stderr(proc):
+        for line in iter(proc.stderr.readline, ""):
+            logger.debug(f"PSHOST STDERR: {line.rstrip()}")
+
+    def _wait_frame(self, request_id: int, timeout: Optional[float]):
+        stray = []
+        while True:
+            try:
+                kind, payload = self._responses.get(timeout=timeout)
+            except queue.Empty:
+                return None
+            if kind == "eof":
+                raise HostRequestError("PowerShell host exited while running a request")
+            if kind == "stray":
+                stray.append(payload)
+                continue
+            if payload.get("id") == request_id:
+                output = "\n".join(stray + ([payload.get("output")] if payload.get("output") else []))
+                return HostResult(int(payload.get("status") or 0), output, payload.get("errors") or "")
+
+    def is_alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def _invoke(self, request: dict, timeout: Optional[float], blocking: bool) -> Optional[HostResult]:
+        if not self._lock.acquire(blocking=blocking):
+            return None
+        try:
+            if not self.is_alive():
+                try:
+                    self._start()
+                except HostUnavailableError:
+                    raise
+                except Exception as e:
+                    raise HostUnavailableError(f"Failed to start PowerShell host: {e}")
+            request_id = self._next_id
+            self._next_id += 1
+            request["id"] = request_id
+            try:
+                self._proc.stdin.write(json.dumps(request) + "\n")
+                self._proc.stdin.flush()
+            except OSError as e:
+                self.close()
+                raise HostUnavailableError(f"PowerShell host pipe closed: {e}")
+            try:
+                result = self._wait_frame(request_id, timeout)
+            except HostRequestError:
+                self.close()
+                raise
+            if result is None:
+                self.close()
+                raise HostRequestError(f"PowerShell host request timed out after {timeout}s")
+            return result
+        finally:
+            self._lock.release()
+
+    def run_command(
+        self,
+        command: str,
+        timeout: Optional[float] = REQUEST_TIMEOUT,
+        blocking: bool = True,
+    ) -> Optional[HostResult]:
+        return self._invoke({"kind": "command", "text": command}, timeout, blocking)
+
+    def run_script(
+        self,
+        script_path: str,
+        args: Optional[List[str]] = None,
+        timeout: Optional[float] = REQUEST_TIMEOUT,
+        blocking: bool = True,
+    ) -> Optional[HostResult]:
+        if args:
+            quoted = script_path.replace("'", "''")
+            quoted_args = " ".join(quote_arg(a) for a in args)
+            return self.run_command(f"& '{quoted}' {quoted_args}", timeout, blocking)
+        return self._invoke({"kind": "script", "path": script_path}, timeout, blocking)
+
+    def close(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            proc.wait(timeout=5)
+        except Exception:
+            proc.kill()
+
+
+
+_host = None
+_host_lock = threading.Lock()
+
+
+
+def host_enabled() -> bool:
+    return os.environ.get("TALON_PS_HOST", "1") != "0"
+
+
+
+def get_host() -> PowerShellHost:
+    global _host
+    with _host_lock:
+        if _host is None:
+            _host = PowerShellHost()
+            atexit.register(shutdown_host)
+        return _host
+
+
+
+def shutdown_host() -> None:
+    global _host
+    with _host_lock:
+        host, _host = _host, None
+    if host is not None:
+        host.close()
+
+
+
+def _stand_in_main() -> int:
+    # Linux stand-in that speaks the host protocol: commands run through
+    # /bin/sh, scripts are executed directly.
+    print(FRAME_MARKER + json.dumps({"id": 0, "status": 0, "output": "ready", "errors": ""}), flush=True)
+    for line in sys.stdin:
+        req = json.loads(line)
+        if req.get("kind") == "script":
+            cmd = [req["path"]]
+        else:
+            cmd = ["/bin/sh", "-c", req["text"]]
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            resp = {"status": proc.returncode, "output": proc.stdout.rstrip("\n"),
+                    "errors": proc.stderr.rstrip("\n")}
+        except Exception as e:
+            resp = {"status": 1, "output": "", "errors": str(e)}
+        resp["id"] = req.get("id")
+        print(FRAME_MARKER + json.dumps(resp), flush=True)
+    return 0
+
+
+
+if __name__ == "__main__":
+    if "--stand-in" in sys.argv:
+        sys.exit(_stand_in_main())
+    host = get_host()
+    print(host.run_command("$PSVersionTable.PSVersion.ToString()"))
+    shutdown_host()
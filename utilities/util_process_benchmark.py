@@ -0,0 +1,94 @@
+import argparse
+import subprocess
+import sys
+import threading
+import time
+from utilities.util_process_runner import run_process
+
+
+
+def _child_cmd(seconds: float, lines: int):
+    code = (
+        "import sys, time\n"
+        f"for i in range({lines}): print('line', i)\n"
+        "sys.stdout.flush()\n"
+        f"time.sleep({seconds})\n"
+    )
+    return [sys.executable, "-c", code]
+
+
+
+def _legacy_run(cmd, cancel_event, sleep):
+    # The reader-thread plus poll loop that util_powershell_handler
+    # (sleep=0.1) and ScriptProcessHandler (sleep=0) used to run.
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
+
+    def _drain(pipe):
+        for _ in iter(pipe.readline, ""):
+            pass
+        pipe.close()
+    threads = [threading.Thread(target=_drain, args=(p,), daemon=True) for p in (proc.stdout, proc.stderr)]
+    for t in threads:
+        t.start()
+    while proc.poll() is None:
+        if cancel_event.is_set():
+            proc.terminate()
+            break
+        if sleep:
+            time.sleep(sleep)
+    for t in threads:
+        t.join()
+    proc.wait()
+
+
+
+def _runner_run(cmd, cancel_event):
+    run_process(cmd, on_output=lambda stream, line: False, cancel_event=cancel_event)
+
+
+
+def measure(name, run, seconds, lines, cancel_after):
+    cancel_event = threading.Event()
+    cancelled_at = []
+    if cancel_after is not None:
+        def _cancel():
+            cancelled_at.append(time.perf_counter())
+            cancel_event.set()
+        timer = threading.Timer(cancel_after, _cancel)
+        timer.start()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    run(_child_cmd(seconds, lines), cancel_event)
+    wall_end = time.perf_counter()
+    cpu = time.process_time() - cpu_start
+    latency = (wall_end - cancelled_at[0]) * 1000 if cancelled_at else None
+    wall = wall_end - wall_start
+    line = f"{name:<22} wall {wall:6.2f}s  parent cpu {cpu * 1000:8.1f} ms ({cpu / wall * 100:5.1f}% of a core)"
+    if latency is not None:
+        line += f"  cancel latency {latency:7.1f} ms"
+    print(line)
+
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Child process runner CPU and cancellation benchmark")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Child lifetime")
+    parser.add_argument("--lines", type=int, default=5000, help="Lines the child prints first")
+    parser.add_argument("--cancel-after", type=float, default=0.5, help="Cancel delay for the second round")
+    args = parser.parse_args(argv)
+    runners = [
+        ("legacy busy poll", lambda cmd, ev: _legacy_run(cmd, ev, 0)),
+        ("legacy 100ms poll", lambda cmd, ev: _legacy_run(cmd, ev, 0.1)),
+        ("async runner", _runner_run),
+    ]
+    print("Run to completion:")
+    for name, run in runners:
+        measure(name, run, args.seconds, args.lines, None)
+    print(f"Cancelled after {args.cancel_after}s:")
+    for name, run in runners:
+        measure(name, run, args.seconds, args.lines, args.cancel_after)
+    return 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import asyncio
+import codecs
+import subprocess
+import sys
+import threading
+from collections import namedtuple
+from typing import Callable, Optional, Sequence
+from utilities.util_logger import logger
+from utilities.util_output_matcher import OutputMatcher, TERMINATE, SUCCESS, FAILURE, PROGRESS
+
+
+
+ProcessResult = namedtuple("ProcessResult", ["returncode", "terminated", "cancelled", "outcome"])
+READ_CHUNK_SIZE = 64 * 1024
+
+
+
+def default_creationflags() -> int:
+    creationflags = 0
+    if sys.platform == "win32":
+        creationflags = subprocess.CREATE_NEW_PROCESS_GROUP
+        if hasattr(subprocess, "CREATE_NO_WINDOW"):
+            creationflags |= subprocess.CREATE_NO_WINDOW
+    return creationflags
+
+
+
+class _CancelWatcher:
+    """One blocked thread per cancel event, fanning out to every run using it."""
+
+    _watchers = {}
+    _lock = threading.Lock()
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+        self.callbacks = set()
+        threading.Thread(target=self._wait, daemon=True, name="cancel-watcher").start()
+
+    def _wait(self):
+        self.event.wait()
+        with _CancelWatcher._lock:
+            callbacks = list(self.callbacks)
+            _CancelWatcher._watchers.pop(id(self.event), None)
+        for callback in callbacks:
+            try:
+                callback()
+            except RuntimeError:
+                pass
+
+    @classmethod
+    def subscribe(cls, event: threading.Event, callback: Callable[[], None]) -> Callable[[], None]:
+        with cls._lock:
+            watcher = cls._watchers.get(id(event))
+            if watcher is None or watcher.event is not event:
+                watcher = cls._watchers[id(event)] = cls(event)
+            watcher.callbacks.add(callback)
+
+        def unsubscribe():
+            with cls._lock:
+                watcher.callbacks.discard(callback)
+        return unsubscribe
+
+
+
+async def _pump(stream, label, on_output, on_match, encoding, scanner=None, on_event=None):
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    while True:
+        chunk = await stream.read(READ_CHUNK_SIZE)
+        text = decoder.decode(chunk, final=not chunk)
+        if text and scanner is not None:
+            for pattern, value in scanner.feed(text):
+                on_event(label, pattern, value)
+        if text:
+            lines = (pending + text).split("\n")
+            pending = lines.pop()
+            for line in lines:
+                if on_output and on_output(label, line.rstrip("\r")):
+                    on_match()
+        if not chunk:
+            break
+    if pending and on_output and on_output(label, pending.rstrip("\r")):
+        on_match()
+
+
+
+async def run_process_async(
+    cmd: Sequence[str],
+    *,
+    on_output: Optional[Callable[[str, str], bool]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    creationflags: Optional[int] = None,
+    encoding: str = "utf-8",
+    matcher: Optional[OutputMatcher] = None,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> ProcessResult:
+    """Run cmd, feeding each decoded line to on_output(label, line).
+
+    A truthy return from on_output terminates the child; setting
+    cancel_event does the same. Both paths are event driven. A matcher is
+    fed raw decoded chunks, so its patterns fire before a line is complete.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        creationflags=default_creationflags() if creationflags is None else creationflags,
+    )
+    loop = asyncio.get_running_loop()
+    state = {"terminated": False, "cancelled": False, "outcome": None}
+
+    def _terminate(reason):
+        if state[reason] or proc.returncode is not None:
+            return
+        state[reason] = True
+        try:
+            proc.terminate()
+        except ProcessLookupError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to terminate pid={proc.pid}: {e}")
+
+    def _on_event(label, pattern, value):
+        logger.debug(f"{label} matched {pattern!r}")
+        if pattern.action == TERMINATE:
+            logger.info(f"Termination pattern '{pattern.pattern}' detected.")
+            _terminate("terminated")
+        elif pattern.action == SUCCESS:
+            state["outcome"] = state["outcome"] or SUCCESS
+        elif pattern.action == FAILURE:
+            state["outcome"] = FAILURE
+        elif pattern.action == PROGRESS and value is not None and on_progress:
+            on_progress(value)
+
+    unsubscribe = None
+    if cancel_event is not None:
+        if cancel_event.is_set():
+            _terminate("cancelled")
+        else:
+            unsubscribe = _CancelWatcher.subscribe(
+                cancel_event,
+                lambda: loop.call_soon_threadsafe(_terminate, "cancelled"),
+            )
+    try:
+        await asyncio.gather(*(
+            _pump(
+                stream, label, on_output, lambda: _terminate("terminated"), encoding,
+                matcher.scanner() if matcher else None, _on_event,
+            )
+            for stream, label in ((proc.stdout, "STDOUT"), (proc.stderr, "STDERR"))
+        ))
+        returncode = await proc.wait()
+    finally:
+        if unsubscribe is not None:
+            unsubscribe()
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+    return ProcessResult(returncode, state["terminated"], state["cancelled"], state["outcome"])
+
+
+
+def run_process(cmd: Sequence[str], **kwargs) -> ProcessResult:
+    return asyncio.run(run_process_async(cmd, **kwargs))
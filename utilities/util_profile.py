@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+from typing import Iterable
+from utilities.util_logger import logger
+
+
+
+_PROFILE_KEYS = {
+    "browser", "steps", "skip_steps", "max_workers", "resume", "reboot",
+    "tweak_tags", "skip_tweak_tags", "reapply_drift",
+}
+
+
+
+def load_profile(path: str, known_steps: Iterable[str]) -> dict:
+    known_steps = list(known_steps)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"Profile {path} must contain a JSON object")
+    unknown = set(data) - _PROFILE_KEYS
+    if unknown:
+        raise ValueError(f"Unknown profile keys: {', '.join(sorted(unknown))}")
+    browser = data.get("browser")
+    if not isinstance(browser, str) or not browser.strip():
+        raise ValueError("Profile must set 'browser' to a Chocolatey package id")
+    if "steps" in data and "skip_steps" in data:
+        raise ValueError("Profile may set 'steps' or 'skip_steps', not both")
+    selected = data.get("steps", known_steps)
+    skipped = data.get("skip_steps", [])
+    for field, slugs in (("steps", selected), ("skip_steps", skipped)):
+        if not isinstance(slugs, list) or not all(isinstance(s, str) for s in slugs):
+            raise ValueError(f"Profile '{field}' must be a list of step names")
+        bad = [s for s in slugs if s not in known_steps]
+        if bad:
+            raise ValueError(f"Unknown steps in profile '{field}': {', '.join(bad)}")
+    max_workers = data.get("max_workers")
+    if max_workers is not None and (not isinstance(max_workers, int) or max_workers < 1):
+        raise ValueError("Profile 'max_workers' must be a positive integer")
+    tweak_tags = data.get("tweak_tags")
+    skip_tweak_tags = data.get("skip_tweak_tags", [])
+    for field, tags in (("tweak_tags", tweak_tags or []), ("skip_tweak_tags", skip_tweak_tags)):
+        if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+            raise ValueError(f"Profile '{field}' must be a list of tweak tags")
+    profile = {
+        "browser": browser.strip(),
+        "skip_steps": [s for s in known_steps if s not in selected or s in skipped],
+        "max_workers": max_workers,
+        "resume": bool(data.get("resume", False)),
+        "reboot": bool(data.get("reboot", True)),
+        "tweak_tags": tweak_tags,
+        "skip_tweak_tags": skip_tweak_tags,
+        "reapply_drift": bool(data.get("reapply_drift", False)),
+    }
+    logger.info(f"Loaded unattended profile {path}: {profile}")
+    return profile
+
+
+
+def save_browser_choice(browser: str) -> str:
+    temp_root = os.environ.get('TEMP', tempfile.gettempdir())
+    dir_path = os.path.join(temp_root, 'talon')
+    os.makedirs(dir_path, exist_ok=True)
+    path = os.path.join(dir_path, 'browser_choice.json')
+    with open(path, 'w') as f:
+        json.dump({'browser': browser}, f)
+    return path
+
+
+
+class ConsoleProgress:
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+
+    def start(self, slug: str, message: str) -> None:
+        print(f"[{self.done}/{self.total}] {message}", flush=True)
+
+    def finish(self, slug: str, ok: bool) -> None:
+        if ok:
+            self.done += 1
+        print(f"[{self.done}/{self.total}] {slug} {'done' if ok else 'FAILED'}", flush=True)
@@ -0,0 +1,582 @@
+import os
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from typing import Any, Iterable, List, Optional, Union
+from utilities.util_logger import logger
+
+
+
+# Same numeric values as the winreg constants, so callers and data files
+# can use them without importing winreg.
+HKEY_CLASSES_ROOT = 0x80000000
+HKEY_CURRENT_USER = 0x80000001
+HKEY_LOCAL_MACHINE = 0x80000002
+HKEY_USERS = 0x80000003
+HKEY_CURRENT_CONFIG = 0x80000005
+REG_NONE = 0
+REG_SZ = 1
+REG_EXPAND_SZ = 2
+REG_BINARY = 3
+REG_DWORD = 4
+REG_MULTI_SZ = 7
+REG_QWORD = 11
+HIVE_MAPPING = {
+    'HKLM': HKEY_LOCAL_MACHINE,
+    'HKEY_LOCAL_MACHINE': HKEY_LOCAL_MACHINE,
+    'HKCU': HKEY_CURRENT_USER,
+    'HKEY_CURRENT_USER': HKEY_CURRENT_USER,
+    'HKCR': HKEY_CLASSES_ROOT,
+    'HKEY_CLASSES_ROOT': HKEY_CLASSES_ROOT,
+    'HKU': HKEY_USERS,
+    'HKEY_USERS': HKEY_USERS,
+    'HKCC': HKEY_CURRENT_CONFIG,
+    'HKEY_CURRENT_CONFIG': HKEY_CURRENT_CONFIG,
+}
+_HIVE_FULL_NAMES = {const: name for name, const in HIVE_MAPPING.items() if name.startswith('HKEY_')}
+_HIVE_SHORT_NAMES = {const: name for name, const in HIVE_MAPPING.items() if not name.startswith('HKEY_')}
+
+
+
+RegistryOp = namedtuple(
+    "RegistryOp",
+    ["hive", "key_path", "name", "value", "value_type", "action"],
+    defaults=(None, None, "set"),
+)
+OpResult = namedtuple("OpResult", ["op", "ok", "error"])
+
+
+
+def resolve_hive(hive: Union[str, int]) -> int:
+    if isinstance(hive, int):
+        return hive
+    key = hive.upper()
+    if key in HIVE_MAPPING:
+        return HIVE_MAPPING[key]
+    raise ValueError(f"Unknown registry hive: {hive!r}")
+
+
+
+def hive_name(hive: Union[str, int]) -> str:
+    if isinstance(hive, str):
+        return hive.upper()
+    if hive in _HIVE_SHORT_NAMES:
+        return _HIVE_SHORT_NAMES[hive]
+    raise ValueError(f"Unknown registry hive: {hive!r}")
+
+
+
+def infer_type(value: Any) -> int:
+    if isinstance(value, int):
+        return REG_DWORD
+    if isinstance(value, str):
+        return REG_SZ
+    if isinstance(value, bytes):
+        return REG_BINARY
+    raise ValueError(f"Unsupported registry value type: {type(value)}")
+
+
+
+def op_type(op: RegistryOp) -> int:
+    return op.value_type if op.value_type is not None else infer_type(op.value)
+
+
+
+def group_by_key(ops: Iterable[RegistryOp]) -> dict:
+    """Group operations by (hive, key path), keeping first-seen order.
+
+    Registry paths are case-insensitive, so keys differing only in case
+    share a group.
+    """
+    groups = {}
+    for index, op in enumerate(ops):
+        group = (resolve_hive(op.hive), op.key_path.strip("\\").lower())
+        groups.setdefault(group, []).append((index, op))
+    return groups
+
+
+
+class RegistryBackend:
+    """Key-level primitives plus a batched apply built on top of them.
+
+    Key handles returned by open_key are context managers with a Close()
+    method. Missing keys and values raise FileNotFoundError, like winreg.
+    """
+
+    name = "base"
+
+    def open_key(self, hive: int, key_path: str, *, read=False, write=False, create=False):
+        raise NotImplementedError
+
+    def query_value(self, key, name: str):
+        raise NotImplementedError
+
+    def set_value(self, key, name: str, value_type: int, value: Any) -> None:
+        raise NotImplementedError
+
+    def delete_value(self, key, name: str) -> None:
+        raise NotImplementedError
+
+    def delete_key(self, hive: int, key_path: str) -> None:
+        raise NotImplementedError
+
+    def read_values(self, key, names: Iterable[str]) -> list:
+        """Return (value, type) or None for each name under an open key."""
+        current = []
+        for name in names:
+            try:
+                current.append(self.query_value(key, name))
+            except FileNotFoundError:
+                current.append(None)
+        return current
+
+    def _record_prior(self, journal, key, first: RegistryOp, members) -> None:
+        names = [op.name for _, op in members]
+        journal.record_many(
+            (hive_name(first.hive), first.key_path, name, current)
+            for name, current in zip(names, self.read_values(key, names) if key is not None else [None] * len(names))
+        )
+
+    def apply(self, ops: List[RegistryOp], journal=None) -> List[OpResult]:
+        ops = list(ops)
+        results = [None] * len(ops)
+        for (hive_const, _), members in group_by_key(ops).items():
+            first = members[0][1]
+            key_label = f"{first.hive}\\{first.key_path}"
+            writes = any(op.action == "set" for _, op in members)
+            try:
+                key = self.open_key(hive_const, first.key_path, read=bool(journal), write=True, create=writes)
+            except FileNotFoundError:
+                for index, op in members:
+                    results[index] = OpResult(op, True, None)
+                logger.info(f"Registry key absent, nothing to delete: {key_label}")
+                continue
+            except Exception as e:
+                for index, op in members:
+                    results[index] = OpResult(op, False, f"cannot open key: {e}")
+                logger.error(f"Cannot open registry key {key_label}: {e}")
+                continue
+            with key:
+                if journal:
+                    try:
+                        self._record_prior(journal, key, first, members)
+                    except Exception as e:
+                        for index, op in members:
+                            results[index] = OpResult(op, False, f"cannot journal prior state: {e}")
+                        logger.error(f"Skipping {key_label}, registry journal write failed: {e}")
+                        continue
+                for index, op in members:
+                    try:
+                        if op.action == "set":
+                            self.set_value(key, op.name, op_type(op), op.value)
+                        elif op.action == "delete":
+                            try:
+                                self.delete_value(key, op.name)
+                            except FileNotFoundError:
+                                pass
+                        else:
+                            raise ValueError(f"Unknown registry action: {op.action!r}")
+                        results[index] = OpResult(op, True, None)
+                    except Exception as e:
+                        results[index] = OpResult(op, False, str(e))
+            ok = sum(1 for index, _ in members if results[index].ok)
+            logger.info(f"Applied {ok}/{len(members)} registry operations under {key_label}")
+        return results
+
+
+
+class WinregBackend(RegistryBackend):
+
+    name = "winreg"
+
+    def __init__(self):
+        import winreg
+        self._winreg = winreg
+        self.view_flag = getattr(winreg, 'KEY_WOW64_64KEY', 0)
+
+    def open_key(self, hive, key_path, *, read=False, write=False, create=False):
+        winreg = self._winreg
+        access = self.view_flag
+        if read:
+            access |= winreg.KEY_READ
+        if write:
+            access |= winreg.KEY_WRITE
+        if create:
+            return winreg.CreateKeyEx(hive, key_path, 0, access)
+        return winreg.OpenKey(hive, key_path, 0, access)
+
+    def query_value(self, key, name):
+        return self._winreg.QueryValueEx(key, name)
+
+    def set_value(self, key, name, value_type, value):
+        self._winreg.SetValueEx(key, name, 0, value_type, value)
+
+    def delete_value(self, key, name):
+        self._winreg.DeleteValue(key, name)
+
+    def delete_key(self, hive, key_path):
+        winreg = self._winreg
+        if hasattr(winreg, 'DeleteKeyEx'):
+            winreg.DeleteKeyEx(hive, key_path, self.view_flag, 0)
+        else:
+            parent_path, _, sub_key = key_path.rpartition('\\')
+            with winreg.OpenKey(hive, parent_path, 0, winreg.KEY_WRITE | self.view_flag) as parent:
+                winreg.DeleteKey(parent, sub_key)
+
+
+
+class _MemoryKey:
+
+    def __init__(self, values: dict):
+        self.values = values
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
+        return False
+
+    def Close(self):
+        self.values = None
+
+
+
+class MemoryBackend(RegistryBackend):
+    """Registry tree held in a dict, for tests and benchmarks off Windows."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _ident(hive, key_path):
+        return (hive, key_path.strip('\\').lower())
+
+    def open_key(self, hive, key_path, *, read=False, write=False, create=False):
+        with self._lock:
+            ident = self._ident(hive, key_path)
+            if ident not in self._keys:
+                if not create:
+                    raise FileNotFoundError(f"Registry key not found: {hive_name(hive)}\\{key_path}")
+                parts = ident[1].split('\\')
+                for depth in range(1, len(parts) + 1):
+                    self._keys.setdefault((hive, '\\'.join(parts[:depth])), {})
+            return _MemoryKey(self._keys[ident])
+
+    def query_value(self, key, name):
+        with self._lock:
+            entry = key.values.get(name.lower())
+        if entry is None:
+            raise FileNotFoundError(f"Registry value not found: {name}")
+        _, value, value_type = entry
+        return (list(value) if isinstance(value, list) else value), value_type
+
+    def set_value(self, key, name, value_type, value):
+        with self._lock:
+            key.values[name.lower()] = (name, list(value) if isinstance(value, list) else value, value_type)
+
+    def delete_value(self, key, name):
+        with self._lock:
+            if key.values.pop(name.lower(), None) is None:
+                raise FileNotFoundError(f"Registry value not found: {name}")
+
+    def delete_key(self, hive, key_path):
+        with self._lock:
+            ident = self._ident(hive, key_path)
+            if ident not in self._keys:
+                raise FileNotFoundError(f"Registry key not found: {hive_name(hive)}\\{key_path}")
+            prefix = ident[1] + '\\'
+            if any(h == hive and path.startswith(prefix) for h, path in self._keys):
+                raise PermissionError(f"Registry key has subkeys: {hive_name(hive)}\\{key_path}")
+            del self._keys[ident]
+
+    def dump(self) -> dict:
+        """Return {(hive, key path): {name: (value, type)}} for inspection."""
+        with self._lock:
+            return {
+                ident: {name: (value, value_type) for name, value, value_type in values.values()}
+                for ident, values in self._keys.items()
+            }
+
+
+
+def _reg_string(text: str) -> str:
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+
+def _reg_hex(type_tag: str, data: bytes) -> str:
+    return f"{type_tag}:" + ",".join(f"{b:02x}" for b in data)
+
+
+
+def reg_file_value(value_type: int, value: Any) -> str:
+    """Encode one value as the right-hand side of a .reg assignment."""
+    if value_type == REG_SZ and isinstance(value, str) and '\n' not in value and '\r' not in value:
+        return _reg_string(value)
+    if value_type == REG_DWORD:
+        return f"dword:{int(value) & 0xFFFFFFFF:08x}"
+    if value_type == REG_QWORD:
+        return _reg_hex("hex(b)", (int(value) & 0xFFFFFFFFFFFFFFFF).to_bytes(8, 'little'))
+    if value_type == REG_BINARY:
+        return _reg_hex("hex", bytes(value))
+    if value_type in (REG_SZ, REG_EXPAND_SZ) and isinstance(value, str):
+        return _reg_hex(f"hex({value_type:x})", (value + '\0').encode('utf-16-le'))
+    if value_type == REG_MULTI_SZ:
+        return _reg_hex("hex(7)", (''.join(s + '\0' for s in value) + '\0').encode('utf-16-le'))
+    if isinstance(value, (bytes, bytearray)):
+        return _reg_hex(f"hex({value_type:x})", bytes(value))
+    raise ValueError(f"Cannot encode registry type {value_type} with value {value!r} in a .reg file")
+
+
+
+def compile_reg_file(ops: Iterable[RegistryOp]) -> tuple:
+    """Compile set/delete ops into .reg text.
+
+    Returns (text, included, errors): the indexes written to the file and
+    {index: message} for ops that could not be encoded.
+    """
+    lines = ["Windows Registry Editor Version 5.00", ""]
+    included = []
+    errors = {}
+    for (hive_const, _), members in group_by_key(ops).items():
+        first = members[0][1]
+        body = []
+        for index, op in members:
+            name = "@" if op.name == "" else _reg_string(op.name)
+            try:
+                if op.action == "set":
+                    body.append(f"{name}={reg_file_value(op_type(op), op.value)}")
+                elif op.action == "delete":
+                    body.append(f"{name}=-")
+                else:
+                    raise ValueError(f"Unknown registry action: {op.action!r}")
+            except Exception as e:
+                errors[index] = str(e)
+                continue
+            included.append(index)
+        if body:
+            lines.append(f"[{_HIVE_FULL_NAMES[hive_const]}\\{first.key_path.strip(chr(92))}]")
+            lines.extend(body)
+            lines.append("")
+    return "\r\n".join(lines) + "\r\n", included, errors
+
+
+
+class RegFileBackend(WinregBackend):
+    """Applies a whole batch with one `reg import`; single calls use winreg."""
+
+    name = "regfile"
+
+    def __init__(self, reg_exe: str = "reg.exe", keep_file: Optional[str] = None):
+        super().__init__()
+        self.reg_exe = reg_exe
+        self.keep_file = keep_file
+
+    def _prefilter(self, ops, journal):
+        # A delete under a missing key would make reg import create the key,
+        # and a journal needs the prior values, so read each key once first.
+        ops = list(ops)
+        skipped = set()
+        for (hive_const, _), members in group_by_key(ops).items():
+            first = members[0][1]
+            writes = any(op.action == "set" for _, op in members)
+            if not journal and writes:
+                continue
+            try:
+                key = self.open_key(hive_const, first.key_path, read=True)
+            except FileNotFoundError:
+                key = None
+            if key is None and not writes:
+                skipped.update(index for index, _ in members)
+                continue
+            try:
+                if journal:
+                    self._record_prior(journal, key, first, members)
+            finally:
+                if key is not None:
+                    key.Close()
+        return skipped
+
+    def apply(self, ops, journal=None):
+        ops = list(ops)
+        results = [None] * len(ops)
+        try:
+            skipped = self._prefilter(ops, journal)
+        except Exception as e:
+            logger.error(f"Registry journal write failed, nothing imported: {e}")
+            return [OpResult(op, False, f"cannot journal prior state: {e}") for op in ops]
+        for index in skipped:
+            results[index] = OpResult(ops[index], True, None)
+        pending = [index for index in range(len(ops)) if index not in skipped]
+        text, included, errors = compile_reg_file(ops[index] for index in pending)
+        for local, message in errors.items():
+            results[pending[local]] = OpResult(ops[pending[local]], False, message)
+        included = [pending[local] for local in included]
+        if not included:
+            return results
+        fd, path = tempfile.mkstemp(prefix="talon-", suffix=".reg")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-16', newline='') as f:
+                f.write(text)
+            if self.keep_file:
+                with open(self.keep_file, 'w', encoding='utf-16', newline='') as f:
+                    f.write(text)
+            cmd = [self.reg_exe, "import", path]
+            if self.view_flag:
+                cmd.append("/reg:64")
+            logger.info(f"Importing {len(included)} registry operations with one reg import")
+            proc = subprocess.run(cmd, capture_output=True, text=True, errors="replace")
+            error = None if proc.returncode == 0 else (
+                (proc.stderr or proc.stdout).strip() or f"reg import exited with {proc.returncode}"
+            )
+        except Exception as e:
+            error = f"reg import failed: {e}"
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        for index in included:
+            results[index] = OpResult(ops[index], error is None, error)
+        return results
+
+
+
+class _CachedHandle:
+
+    __slots__ = ("handle", "refs", "retired")
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.refs = 0
+        self.retired = False
+
+
+
+class KeyHandleCache:
+    """Bounded LRU of open key handles keyed by (hive, path, access).
+
+    Handles are lent out through lease(); one that is evicted, flushed or
+    invalidated while leased is closed when its last lease ends, so
+    concurrent users never see a handle closed underneath them.
+    """
+
+    def __init__(self, backend: RegistryBackend, max_size: int = 64):
+        self.backend = backend
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _close(entry: _CachedHandle) -> None:
+        try:
+            entry.handle.Close()
+        except Exception as e:
+            logger.debug(f"Closing cached registry handle failed: {e}")
+
+    def _retire(self, ident) -> None:
+        entry = self._entries.pop(ident)
+        entry.retired = True
+        if entry.refs == 0:
+            self._close(entry)
+
+    def _evict(self) -> None:
+        for ident in list(self._entries):
+            if len(self._entries) <= self.max_size:
+                break
+            if self._entries[ident].refs == 0:
+                self._retire(ident)
+
+    def _acquire(self, hive, key_path, read, write, create) -> tuple:
+        ident = (hive, key_path.strip('\\').lower(), bool(read), bool(write))
+        with self._lock:
+            entry = self._entries.get(ident)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(ident)
+            else:
+                self.misses += 1
+                entry = _CachedHandle(
+                    self.backend.open_key(hive, key_path, read=read, write=write, create=create)
+                )
+                self._entries[ident] = entry
+            entry.refs += 1
+            self._evict()
+            return ident, entry
+
+    def _release(self, ident, entry: _CachedHandle, failed: bool) -> None:
+        with self._lock:
+            entry.refs -= 1
+            if failed and not entry.retired and self._entries.get(ident) is entry:
+                self._retire(ident)
+            elif entry.retired and entry.refs == 0:
+                self._close(entry)
+
+    @contextmanager
+    def lease(self, hive: int, key_path: str, *, read=False, write=False, create=False, optional=False):
+        """Lend a handle; with optional=True a key that cannot be opened yields None."""
+        try:
+            ident, entry = self._acquire(hive, key_path, read, write, create)
+        except OSError as e:
+            if not optional:
+                raise
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Cannot open registry key {hive_name(hive)}\\{key_path}: {e}")
+            yield None
+            return
+        failed = False
+        try:
+            yield entry.handle
+        except FileNotFoundError:
+            raise
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._release(ident, entry, failed)
+
+    def invalidate(self, hive: int, key_path: str) -> None:
+        """Drop handles for a key and everything below it."""
+        path = key_path.strip('\\').lower()
+        with self._lock:
+            for ident in list(self._entries):
+                if ident[0] == hive and (ident[1] == path or ident[1].startswith(path + '\\')):
+                    self._retire(ident)
+
+    def flush(self) -> None:
+        """Close every handle; leased ones close when released."""
+        with self._lock:
+            count = len(self._entries)
+            for ident in list(self._entries):
+                self._retire(ident)
+            if count or self.hits:
+                logger.debug(
+                    f"Flushed {count} cached registry handles "
+                    f"({self.hits} hits, {self.misses} misses)"
+                )
+            self.hits = self.misses = 0
+
+
+
+BACKENDS = {
+    WinregBackend.name: WinregBackend,
+    MemoryBackend.name: MemoryBackend,
+    RegFileBackend.name: RegFileBackend,
+}
+
+
+
+def create_backend(name: str) -> RegistryBackend:
+    try:
+        factory = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown registry backend: {name!r} (choose from {', '.join(BACKENDS)})")
+    return factory()
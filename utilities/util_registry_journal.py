@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+from typing import Iterable, List, Optional
+from utilities.util_logger import logger
+
+
+
+# One JSON array per line: [hive, key_path, name, existed, type, value].
+# Binary values are stored as {"hex": "..."}. Lines are only ever appended,
+# so the first record for a value is its state before Talon touched it.
+_active = None
+_active_lock = threading.Lock()
+
+
+
+def _get_journal_path(filename: str = 'registry_journal.jsonl') -> str:
+    temp_dir = os.environ.get('TEMP', tempfile.gettempdir())
+    return os.path.join(temp_dir, 'talon', filename)
+
+
+
+def _encode_value(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {'hex': bytes(value).hex()}
+    return value
+
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and 'hex' in value:
+        return bytes.fromhex(value['hex'])
+    return value
+
+
+
+class RegistryJournal:
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or _get_journal_path()
+        self._lock = threading.Lock()
+        self._file = None
+
+    def record_many(self, entries: Iterable[tuple]) -> None:
+        """Append (hive, key_path, name, current) entries and fsync.
+
+        current is the (value, type) pair read before the write, or None
+        when the value did not exist.
+        """
+        lines = []
+        for hive, key_path, name, current in entries:
+            if current is None:
+                row = [hive, key_path, name, 0, None, None]
+            else:
+                value, value_type = current
+                row = [hive, key_path, name, 1, value_type, _encode_value(value)]
+            lines.append(json.dumps(row, separators=(',', ':')) + '\n')
+        if not lines:
+            return
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(''.join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def read(self) -> List[tuple]:
+        """Return (hive, key_path, name, existed, type, value) rows in order."""
+        rows = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for lineno, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        hive, key_path, name, existed, value_type, value = json.loads(line)
+                    except ValueError:
+                        logger.warning(f"Skipping malformed registry journal line {lineno} in {self.path}")
+                        continue
+                    rows.append((hive, key_path, name, bool(existed), value_type, _decode_value(value)))
+        except FileNotFoundError:
+            pass
+        return rows
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+
+def set_active_journal(journal: Optional[RegistryJournal]) -> None:
+    global _active
+    with _active_lock:
+        _active = journal
+
+
+
+def active_journal() -> Optional[RegistryJournal]:
+    return _active
+
+
+
+def rollback(journal) -> list:
+    """Restore every journaled value to its earliest recorded state.
+
+    journal is a RegistryJournal or a journal file path. Values that did
+    not exist before are deleted. Returns the OpResults of the batched write.
+    """
+    from utilities.util_modify_registry import RegistryOp, apply_many
+    if not isinstance(journal, RegistryJournal):
+        journal = RegistryJournal(journal)
+    original = {}
+    for hive, key_path, name, existed, value_type, value in journal.read():
+        ident = (hive.upper(), key_path.strip('\\').lower(), (name or '').lower())
+        if ident not in original:
+            original[ident] = (hive, key_path, name, existed, value_type, value)
+    ops = [
+        RegistryOp(hive, key_path, name, value, value_type, 'set')
+        if existed else
+        RegistryOp(hive, key_path, name, action='delete')
+        for hive, key_path, name, existed, value_type, value in original.values()
+    ]
+    if not ops:
+        logger.info(f"Registry journal {journal.path} is empty; nothing to roll back")
+        return []
+    logger.info(f"Rolling back {len(ops)} registry values from {journal.path}")
+    return apply_many(ops, record=False)
+
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Restore registry values recorded in a Talon registry journal")
+    parser.add_argument("journal", nargs="?", default=None, help="Journal file (default: %%TEMP%%\\talon\\registry_journal.jsonl)")
+    args = parser.parse_args(argv)
+    results = rollback(args.journal or _get_journal_path())
+    failed = [r for r in results if not r.ok]
+    print(f"Restored {len(results) - len(failed)}/{len(results)} registry values")
+    return 1 if failed else 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
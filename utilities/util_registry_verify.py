@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from utilities.util_logger import logger
+from utilities.util_modify_registry import apply_many, diff_values
+from utilities.util_registry_backend import OpResult, RegistryOp, resolve_hive
+from utilities.util_trace import traced
+from utilities.util_tweak_catalog import Tweak
+
+
+
+REPORT_VERSION = 1
+
+
+
+def _get_report_path(filename: str = 'registry_drift.json') -> str:
+    temp_dir = os.environ.get('TEMP', tempfile.gettempdir())
+    return os.path.join(temp_dir, 'talon', filename)
+
+
+
+def _json_value(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {'hex': bytes(value).hex()}
+    return value
+
+
+
+class DriftReport:
+    """Expected vs actual state for every verified tweak."""
+
+    def __init__(self, checked: int, drifted: list, elapsed: float):
+        self.checked = checked
+        self.drifted = drifted
+        self.elapsed = elapsed
+
+    def __bool__(self):
+        return bool(self.drifted)
+
+    def ops(self) -> List[RegistryOp]:
+        return [op for _, op, _ in self.drifted]
+
+    def to_dict(self) -> dict:
+        return {
+            'version': REPORT_VERSION,
+            'generated_at': time.time(),
+            'checked': self.checked,
+            'drifted': len(self.drifted),
+            'elapsed_ms': round(self.elapsed * 1000, 1),
+            'entries': [
+                {
+                    'id': tweak_id,
+                    'hive': op.hive,
+                    'path': op.key_path,
+                    'name': op.name,
+                    'status': 'missing' if current is None else 'drifted',
+                    'expected': {'type': op.value_type, 'value': _json_value(op.value)},
+                    'actual': None if current is None else {
+                        'type': current[1], 'value': _json_value(current[0]),
+                    },
+                }
+                for tweak_id, op, current in self.drifted
+            ],
+        }
+
+    def write(self, path: Optional[str] = None) -> str:
+        path = path or _get_report_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+
+
+@traced("registry.verify", "registry", lambda tweaks, *a, **k: {"tweaks": len(tweaks)})
+def verify_tweaks(tweaks: List[Tweak], max_workers: int = 4) -> DriftReport:
+    """Read back every tweak, one diff batch per hive, hives in parallel."""
+    start = time.monotonic()
+    by_hive = {}
+    for tweak in tweaks:
+        op = RegistryOp(tweak.hive, tweak.path, tweak.name, tweak.value, tweak.type)
+        by_hive.setdefault(resolve_hive(tweak.hive), []).append((tweak.id, op))
+    drifted = []
+    if by_hive:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(by_hive))), thread_name_prefix="verify") as pool:
+            futures = [
+                (entries, pool.submit(diff_values, [op for _, op in entries]))
+                for entries in by_hive.values()
+            ]
+            for entries, future in futures:
+                changes = future.result()
+                ids = {id(op): tweak_id for tweak_id, op in entries}
+                for op, current in changes.changed + changes.missing:
+                    drifted.append((ids[id(op)], op, current))
+    report = DriftReport(len(tweaks), drifted, time.monotonic() - start)
+    for tweak_id, op, current in drifted:
+        actual = "missing" if current is None else f"{current[0]!r} (type={current[1]})"
+        logger.warning(
+            f"Registry drift in {tweak_id}: {op.hive}\\{op.key_path}\\{op.name} "
+            f"expected {op.value!r} (type={op.value_type}), found {actual}"
+        )
+    logger.info(f"Verified {report.checked} registry tweaks: {len(drifted)} drifted")
+    return report
+
+
+
+def reapply_drift(report: DriftReport) -> List[OpResult]:
+    """Write back only the drifted entries."""
+    ops = report.ops()
+    if not ops:
+        return []
+    logger.info(f"Reapplying {len(ops)} drifted registry tweaks")
+    return apply_many(ops)
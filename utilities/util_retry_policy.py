@@ -0,0 +1,126 @@
+import http.client
+import random
+import threading
+import time
+from typing import Optional
+from utilities.util_http_pool import HttpError
+from utilities.util_logger import logger
+
+
+
+RETRIABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+
+class CircuitOpenError(OSError):
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"Too many recent failures for {host}; not retrying for {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+
+class BudgetExceededError(OSError):
+    pass
+
+
+
+def is_retriable(exc: BaseException) -> bool:
+    """Transient network and server errors are worth another attempt."""
+    if isinstance(exc, (CircuitOpenError, BudgetExceededError)):
+        return False
+    if isinstance(exc, HttpError):
+        return exc.status in RETRIABLE_STATUSES
+    return isinstance(exc, (OSError, http.client.HTTPException))
+
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by attempts and a time budget.
+
+    The delay before attempt n+1 is a random value in
+    [0, min(max_delay, base_delay * 2**(n-1))]; budget caps the wall time
+    of all attempts and sleeps together.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 6,
+        base_delay: float = 0.5,
+        max_delay: float = 15.0,
+        budget: float = 600.0,
+        rng: Optional[random.Random] = None,
+    ):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self._rng = rng or random.Random()
+
+    def backoff(self, attempt: int) -> float:
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+
+class CircuitBreaker:
+    """Per-host breaker shared by every download in the run.
+
+    After threshold consecutive failures a host is skipped for cooldown
+    seconds; then one request is let through, and its outcome closes the
+    breaker again or restarts the cooldown.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def before_request(self, host: str) -> None:
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or state['opened_at'] is None:
+                return
+            waited = time.monotonic() - state['opened_at']
+            if waited < self.cooldown or state['probing']:
+                raise CircuitOpenError(host, max(0.0, self.cooldown - waited))
+            state['probing'] = True
+
+    def record_success(self, host: str) -> None:
+        with self._lock:
+            state = self._hosts.pop(host, None)
+        if state and state['opened_at'] is not None:
+            logger.info(f"Circuit for {host} closed again")
+
+    def record_failure(self, host: str) -> None:
+        with self._lock:
+            state = self._hosts.setdefault(host, {'failures': 0, 'opened_at': None, 'probing': False})
+            state['failures'] += 1
+            state['probing'] = False
+            if state['failures'] < self.threshold:
+                return
+            reopened = state['opened_at'] is not None
+            state['opened_at'] = time.monotonic()
+        if not reopened:
+            logger.warning(f"Circuit for {host} opened after {self.threshold} consecutive failures")
+
+    def is_open(self, host: str) -> bool:
+        with self._lock:
+            state = self._hosts.get(host)
+            return bool(state) and state['opened_at'] is not None \
+                and time.monotonic() - state['opened_at'] < self.cooldown
+
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+
+def get_breaker() -> CircuitBreaker:
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker()
+        return _breaker
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from collections import namedtuple
+from typing import List, Optional
+from utilities.util_logger import logger
+
+
+
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 64 * 1024
+Artifact = namedtuple("Artifact", ["name", "url", "sha256", "mirrors", "rolling"], defaults=((), False))
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+_cache = {}
+_cache_lock = threading.Lock()
+_verified = {}
+_verified_lock = threading.Lock()
+
+
+
+class IntegrityError(ValueError):
+
+    def __init__(self, name: str, expected: str, actual: str):
+        super().__init__(f"{name} does not match its pinned SHA-256 (expected {expected}, got {actual})")
+        self.name = name
+        self.expected = expected
+        self.actual = actual
+
+
+
+def default_manifest_path() -> str:
+    if getattr(sys, 'frozen', False):
+        base_path = os.path.dirname(sys.executable)
+    else:
+        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_path, 'configs', 'script_manifest.json')
+
+
+
+def validate_manifest(data) -> List[Artifact]:
+    if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Script manifest must be an object with \"version\": {MANIFEST_VERSION}")
+    entries = data.get("artifacts")
+    if not isinstance(entries, list):
+        raise ValueError("Script manifest must have an 'artifacts' list")
+    errors = []
+    artifacts = []
+    seen = set()
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            errors.append(f"artifact #{position + 1}: must be an object")
+            continue
+        label = f"artifact {entry.get('name', '#' + str(position + 1))!s}"
+        name, url, sha256 = entry.get("name"), entry.get("url"), entry.get("sha256")
+        mirrors = entry.get("mirrors", [])
+        rolling = entry.get("rolling", False)
+        if not isinstance(name, str) or not name or os.path.basename(name) != name:
+            errors.append(f"{label}: name must be a plain file name")
+        elif name.lower() in seen:
+            errors.append(f"{label}: duplicate name")
+        if not isinstance(url, str) or not url.startswith(("https://", "http://")):
+            errors.append(f"{label}: url must be an http(s) URL")
+        if sha256 is not None and (not isinstance(sha256, str) or not _SHA256_RE.match(sha256)):
+            errors.append(f"{label}: sha256 must be 64 lowercase hex digits or null")
+        if not isinstance(mirrors, list) or not all(
+            isinstance(m, str) and m.startswith(("https://", "http://")) for m in mirrors
+        ):
+            errors.append(f"{label}: mirrors must be a list of http(s) URLs")
+            mirrors = []
+        if not isinstance(rolling, bool):
+            errors.append(f"{label}: rolling must be true or false")
+        elif rolling and sha256 is not None:
+            errors.append(f"{label}: a rolling artifact cannot have a pinned sha256")
+        if isinstance(name, str):
+            seen.add(name.lower())
+        artifacts.append(Artifact(name, url, sha256, tuple(mirrors), rolling is True))
+    if errors:
+        raise ValueError("Invalid script manifest:\n" + "\n".join(errors))
+    return artifacts
+
+
+
+class ScriptManifest:
+    """Pinned artifacts, looked up by file name or URL."""
+
+    def __init__(self, artifacts, source: Optional[str] = None):
+        self.source = source
+        self.artifacts = list(artifacts)
+        self.by_name = {a.name.lower(): a for a in self.artifacts}
+        self.by_url = {u: a for a in self.artifacts for u in (a.url, *a.mirrors)}
+
+    def __len__(self):
+        return len(self.artifacts)
+
+    def get(self, name: str) -> Artifact:
+        try:
+            return self.by_name[name.lower()]
+        except KeyError:
+            raise KeyError(f"{name} is not listed in the script manifest")
+
+    def pinned(self, name: str) -> Optional[str]:
+        artifact = self.by_name.get(os.path.basename(name).lower())
+        return artifact.sha256 if artifact else None
+
+
+
+def load_manifest(path: Optional[str] = None) -> ScriptManifest:
+    """Load and validate a manifest once per file version."""
+    path = os.path.abspath(path or default_manifest_path())
+    mtime = os.path.getmtime(path)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        data = json.load(f)
+    manifest = ScriptManifest(validate_manifest(data), path)
+    unpinned = [a.name for a in manifest.artifacts if a.sha256 is None and not a.rolling]
+    if unpinned:
+        logger.warning(f"Script manifest has no pinned digest for: {', '.join(unpinned)}; they will not run")
+    with _cache_lock:
+        _cache[path] = (mtime, manifest)
+    return manifest
+
+
+
+def _stat_key(path: str) -> tuple:
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+
+def mark_verified(path: str, sha256: str) -> None:
+    """Remember a digest computed while path was written, so it is not hashed again."""
+    with _verified_lock:
+        _verified[os.path.normcase(os.path.abspath(path))] = (sha256, _stat_key(path))
+
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb') as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+
+def check_digest(name: str, expected: Optional[str], actual: str) -> None:
+    if expected is not None and actual != expected:
+        raise IntegrityError(name, expected, actual)
+
+
+
+def verify_file(path: str, manifest: Optional[ScriptManifest] = None) -> Optional[str]:
+    """Check path against its pinned digest before it is executed.
+
+    Files hashed during download are trusted while their size and mtime
+    are unchanged; anything else is hashed here. A listed artifact without
+    a digest is refused unless it is marked rolling. Returns the digest,
+    or None for rolling artifacts and files the manifest does not list.
+    """
+    manifest = manifest or load_manifest()
+    name = os.path.basename(path)
+    expected = manifest.pinned(name)
+    if expected is None:
+        artifact = manifest.by_name.get(name.lower())
+        if artifact is not None and not artifact.rolling:
+            raise IntegrityError(name, "a pinned digest", "none (run: python -m utilities.util_script_manifest pin)")
+        return None
+    key = os.path.normcase(os.path.abspath(path))
+    with _verified_lock:
+        known = _verified.get(key)
+    if known is not None and known[1] == _stat_key(path):
+        actual = known[0]
+    else:
+        actual = file_sha256(path)
+    check_digest(name, expected, actual)
+    logger.info(f"Verified {name} against pinned SHA-256 {expected[:12]}")
+    return actual
+
+
+
+def pin_manifest(path: Optional[str] = None) -> int:
+    """Download every non-rolling artifact and write its current digest into the manifest."""
+    from utilities.util_http_pool import get_pool
+    path = path or default_manifest_path()
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        data = json.load(f)
+    validate_manifest(data)
+    changed = 0
+    for entry in data["artifacts"]:
+        if entry.get("rolling"):
+            continue
+        digest = hashlib.sha256()
+        with get_pool().open(entry["url"]) as response:
+            while True:
+                chunk = response.read(HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        if entry.get("sha256") != sha256:
+            print(f"{entry['name']}: {entry.get('sha256')} -> {sha256}")
+            entry["sha256"] = sha256
+            changed += 1
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+        f.write("\n")
+    os.replace(tmp_path, path)
+    return changed
+
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ("pin", "check"):
+        print("usage: python -m utilities.util_script_manifest {pin|check} [manifest]")
+        return 2
+    path = argv[1] if len(argv) > 1 else None
+    if argv[0] == "pin":
+        print(f"{pin_manifest(path)} digests updated")
+        return 0
+    manifest = load_manifest(path)
+    for artifact in manifest.artifacts:
+        state = artifact.sha256 or ('ROLLING' if artifact.rolling else 'UNPINNED')
+        print(f"{artifact.name}: {state}  {artifact.url}")
+    return 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
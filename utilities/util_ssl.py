@@ -1,15 +1,31 @@
 import ssl
-import certifi
+import threading
 from .util_logger import logger
 
 
 
 def create_ssl_context() -> ssl.SSLContext:
     try:
+        import certifi
         cafile = certifi.where()
         return ssl.create_default_context(cafile=cafile)
     except Exception as e:
         logger.warning(
             f"Failed to load certifi CA bundle: {e}; falling back to system store"
         )
-        return ssl.create_default_context()
\ No newline at end of file
+        return ssl.create_default_context()
+
+
+
+_context = None
+_context_lock = threading.Lock()
+
+
+
+def get_ssl_context() -> ssl.SSLContext:
+    """One context per run; loading the CA bundle is the expensive part."""
+    global _context
+    with _context_lock:
+        if _context is None:
+            _context = create_ssl_context()
+        return _context
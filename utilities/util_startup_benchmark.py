@@ -0,0 +1,104 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+
+
+# Modules that must not be loaded just by importing the entry point; they
+# are pulled in on demand by the screen or step that needs them.
+DEFERRED_PREFIXES = (
+    "PyQt5",
+    "debloat_components",
+    "preinstall_components",
+    "ui_components",
+    "certifi",
+)
+
+
+
+def _repo_root() -> str:
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+
+def parse_importtime(stderr: str) -> list:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+
+def measure(code: str, runs: int = 5) -> dict:
+    walls, rows, loaded = [], [], []
+    marker = "__TALON_MODULES__"
+    probe = f"{code}\nimport sys\nprint({marker!r} + ','.join(sorted(sys.modules)))"
+    env = dict(os.environ, TALON_LOG_LEVEL=os.environ.get("TALON_LOG_LEVEL", "WARNING"))
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", probe],
+            cwd=_repo_root(),
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        walls.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Import probe failed:\n{proc.stderr[-2000:]}")
+        rows = parse_importtime(proc.stderr)
+        for line in proc.stdout.splitlines():
+            if line.startswith(marker):
+                loaded = line[len(marker):].split(",")
+    walls.sort()
+    top_level = [r for r in rows if r[3] == 0]
+    return {
+        "wall_ms": walls[len(walls) // 2] * 1000,
+        "import_ms": sum(r[2] for r in top_level) / 1000,
+        "slowest": sorted(rows, key=lambda r: r[1], reverse=True)[:15],
+        "modules": loaded,
+    }
+
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Talon startup-time budget check")
+    parser.add_argument("--budget-ms", type=float, default=400.0,
+                        help="Maximum median wall time to the first screen")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--entry-only", action="store_true",
+                        help="Only import talon.py, not the first screen module")
+    args = parser.parse_args(argv)
+    code = "import talon"
+    if not args.entry_only:
+        code += "\nfrom screens import load\nload('screen_browser_select')"
+    entry = measure("import talon", args.runs)
+    result = entry if args.entry_only else measure(code, args.runs)
+    print(f"talon.py import: {entry['wall_ms']:.1f} ms wall, {entry['import_ms']:.1f} ms in imports")
+    if not args.entry_only:
+        print(f"first screen ready to build: {result['wall_ms']:.1f} ms wall, {result['import_ms']:.1f} ms in imports")
+    print("slowest modules (self time):")
+    for name, self_us, cumulative_us, _ in result["slowest"]:
+        print(f"  {self_us / 1000:8.1f} ms  {cumulative_us / 1000:8.1f} ms cum  {name}")
+    failures = []
+    eager = [m for m in entry["modules"] if m.startswith(DEFERRED_PREFIXES)]
+    if eager:
+        failures.append(f"modules imported eagerly by talon.py: {', '.join(eager)}")
+    if result["wall_ms"] > args.budget_ms:
+        failures.append(f"{result['wall_ms']:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: startup within budget")
+    return 1 if failures else 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Iterable, Optional
+from utilities.util_logger import logger
+
+
+
+JOURNAL_VERSION = 1
+
+
+
+def _get_journal_path(filename: str = 'step_journal.json') -> str:
+    temp_dir = os.environ.get('TEMP', tempfile.gettempdir())
+    return os.path.join(temp_dir, 'talon', filename)
+
+
+
+def fingerprint_inputs(slug: str, inputs: Iterable[str] = ()) -> str:
+    digest = hashlib.sha256(slug.encode('utf-8'))
+    for path in inputs:
+        digest.update(b'\0' + os.path.abspath(path).encode('utf-8') + b'\0')
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    digest.update(chunk)
+        except OSError:
+            digest.update(b'<missing>')
+    return digest.hexdigest()
+
+
+
+class StepJournal:
+
+    def __init__(self, path: Optional[str] = None, resume: bool = False):
+        self.path = path or _get_journal_path()
+        self._lock = threading.Lock()
+        self._ran = set()
+        self.previous = self._load()
+        if resume:
+            self.entries = dict(self.previous)
+            logger.info(f"Resuming from journal {self.path} ({len(self.entries)} recorded steps)")
+        else:
+            self.entries = {}
+            try:
+                self._flush()
+            except Exception as e:
+                logger.error(f"Failed to reset step journal {self.path}: {e}")
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable step journal {self.path}: {e}")
+            return {}
+        if data.get('version') != JOURNAL_VERSION:
+            logger.warning(f"Ignoring step journal with unknown version: {data.get('version')!r}")
+            return {}
+        return data.get('steps') or {}
+
+    def _flush(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': JOURNAL_VERSION, 'steps': self.entries}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def is_complete(self, slug: str, fingerprint: str) -> bool:
+        with self._lock:
+            entry = self.entries.get(slug)
+        return bool(
+            entry
+            and entry.get('outcome') == 'success'
+            and entry.get('fingerprint') == fingerprint
+        )
+
+    def record(self, slug: str, outcome: str, duration: float, fingerprint: str) -> None:
+        with self._lock:
+            self.entries[slug] = {
+                'outcome': outcome,
+                'duration': round(duration, 3),
+                'fingerprint': fingerprint,
+                'finished_at': time.time(),
+            }
+            try:
+                self._flush()
+            except Exception as e:
+                logger.error(f"Failed to write step journal {self.path}: {e}")
+
+    def durations(self) -> dict:
+        with self._lock:
+            return {
+                slug: entry['duration']
+                for slug, entry in self.previous.items()
+                if entry.get('outcome') == 'success' and entry.get('duration')
+            }
+
+    def ran(self, slug: str) -> bool:
+        """Whether slug actually ran in this session, rather than being skipped."""
+        with self._lock:
+            return slug in self._ran
+
+    def wrap(self, slug: str, func, inputs=(), requires: Iterable[str] = ()):
+        requires = list(requires)
+
+        def _run():
+            missing = [r for r in requires if not self.ran(r)]
+            if missing:
+                # Nothing is recorded, so a later run that does perform
+                # the required steps runs this one as well.
+                logger.info(f"Skipping {slug} step ({', '.join(missing)} did not run in this session)")
+                return
+            fingerprint = fingerprint_inputs(slug, inputs() if callable(inputs) else inputs)
+            if self.is_complete(slug, fingerprint):
+                logger.info(f"Skipping {slug} step (already completed, journal fingerprint matches)")
+                return
+            start = time.monotonic()
+            try:
+                func()
+            except BaseException:
+                self.record(slug, 'failed', time.monotonic() - start, fingerprint)
+                raise
+            # Fingerprint again so files the step itself produced (downloads)
+            # are covered: deleting or changing them makes --resume rerun it.
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._ran.add(slug)
+            self.record(slug, 'success', elapsed, fingerprint_inputs(slug, inputs() if callable(inputs) else inputs))
+        return _run
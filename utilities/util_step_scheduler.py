@@ -0,0 +1,136 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+from utilities.util_logger import logger
+
+
+
+def _validate_graph(steps: Sequence[Tuple]) -> Dict[str, Tuple]:
+    by_slug = {}
+    for step in steps:
+        slug = step[0]
+        if slug in by_slug:
+            raise ValueError(f"Duplicate debloat step: {slug}")
+        by_slug[slug] = step
+    for slug, _, _, depends_on, conflicts_with in steps:
+        for dep in list(depends_on) + list(conflicts_with):
+            if dep not in by_slug:
+                raise ValueError(f"Step '{slug}' references unknown step '{dep}'")
+    visiting, done = set(), set()
+
+    def _visit(slug, chain):
+        if slug in done:
+            return
+        if slug in visiting:
+            raise ValueError(f"Dependency cycle detected: {' -> '.join(chain + [slug])}")
+        visiting.add(slug)
+        for dep in by_slug[slug][3]:
+            _visit(dep, chain + [slug])
+        visiting.discard(slug)
+        done.add(slug)
+    for slug in by_slug:
+        _visit(slug, [])
+    return by_slug
+
+
+
+def critical_path_lengths(
+    steps: Sequence[Tuple],
+    weights: Optional[Dict[str, float]] = None,
+) -> Dict[str, float]:
+    by_slug = _validate_graph(steps)
+    weights = weights or {}
+    dependents = {slug: [] for slug in by_slug}
+    for slug, _, _, depends_on, _ in steps:
+        for dep in depends_on:
+            dependents[dep].append(slug)
+    lengths = {}
+
+    def _length(slug):
+        if slug not in lengths:
+            tail = max((_length(d) for d in dependents[slug]), default=0.0)
+            lengths[slug] = float(weights.get(slug, 1.0)) + tail
+        return lengths[slug]
+    for slug in by_slug:
+        _length(slug)
+    return lengths
+
+
+
+def run_step_graph(
+    steps: Sequence[Tuple],
+    *,
+    max_workers: int = 2,
+    skip: Iterable[str] = (),
+    weights: Optional[Dict[str, float]] = None,
+    on_start: Optional[Callable[[str, str], None]] = None,
+    on_finish: Optional[Callable[[str, bool], None]] = None,
+) -> bool:
+    """Run (slug, message, func, depends_on, conflicts_with) steps as a DAG.
+
+    Ready steps are started longest-critical-path first on a bounded pool;
+    a step never runs alongside one it conflicts with. Returns False as soon
+    as any step fails, after letting already running steps finish.
+    """
+    by_slug = _validate_graph(steps)
+    order = {step[0]: idx for idx, step in enumerate(steps)}
+    priority = critical_path_lengths(steps, weights)
+    conflicts = {slug: set(step[4]) for slug, step in by_slug.items()}
+    for slug, others in list(conflicts.items()):
+        for other in others:
+            conflicts[other].add(slug)
+    skip = set(skip)
+    finished = set()
+    for slug in skip:
+        if slug in by_slug:
+            logger.info(f"Skipping {slug} step")
+            finished.add(slug)
+    pending = [slug for slug in by_slug if slug not in finished]
+    running = {}
+    failed = threading.Event()
+    workers = max(1, int(max_workers or 1))
+    logger.info(f"Scheduling {len(pending)} debloat steps on up to {workers} workers")
+
+    def _ready():
+        candidates = [
+            slug for slug in pending
+            if all(dep in finished for dep in by_slug[slug][3])
+        ]
+        candidates.sort(key=lambda s: (-priority[s], order[s]))
+        return candidates
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="debloat-step") as executor:
+        while pending or running:
+            if not failed.is_set():
+                for slug in _ready():
+                    if len(running) >= workers:
+                        break
+                    active = set(running.values())
+                    if conflicts[slug] & active:
+                        continue
+                    _, message, func, _, _ = by_slug[slug]
+                    if on_start:
+                        on_start(slug, message)
+                    logger.info(f"Starting {slug} step")
+                    pending.remove(slug)
+                    running[executor.submit(func)] = slug
+            if not running:
+                if pending and not failed.is_set():
+                    raise RuntimeError(f"Unschedulable debloat steps: {', '.join(pending)}")
+                break
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                slug = running.pop(future)
+                try:
+                    future.result()
+                except BaseException as e:
+                    logger.error(f"Step {slug} failed: {e!r}")
+                    failed.set()
+                    if on_finish:
+                        on_finish(slug, False)
+                    continue
+                logger.info(f"Finished {slug} step")
+                finished.add(slug)
+                if on_finish:
+                    on_finish(slug, True)
+    return not failed.is_set()
@@ -0,0 +1,162 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+from collections import namedtuple
+from typing import Iterable, Optional
+from utilities.util_logger import logger
+from utilities.util_modify_registry import get_backend
+from utilities.util_powershell_host import HostUnavailableError, get_host, host_enabled
+from utilities.util_registry_backend import HKEY_LOCAL_MACHINE
+
+
+
+CURRENT_VERSION_KEY = r"SOFTWARE\Microsoft\Windows NT\CurrentVersion"
+PROBE_TIMEOUT = 60
+SystemInfo = namedtuple(
+    "SystemInfo",
+    [
+        "product_name",
+        "build",
+        "edition",
+        "defender_exclusions",
+        "defender_error",
+        "powershell_available",
+        "powershell_version",
+    ],
+)
+# Everything that needs PowerShell, in one invocation. Defender errors are
+# reported in the result instead of failing the whole probe.
+SYSTEM_PROBE = (
+    "$mp = $null; $mpError = $null; "
+    "try { $mp = @((Get-MpPreference -ErrorAction Stop).ExclusionPath | Where-Object { $_ }) } "
+    "catch { $mpError = $_.ToString() }; "
+    "@{ exclusions = $mp; defender_error = $mpError; "
+    "ps_version = $PSVersionTable.PSVersion.ToString() } | ConvertTo-Json -Compress"
+)
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+
+def detect_edition(product_name: Optional[str]) -> Optional[str]:
+    if not product_name:
+        return None
+    if "Home" in product_name:
+        return "Home"
+    if "Professional" in product_name or "Pro" in product_name:
+        return "Professional"
+    if "Enterprise" in product_name:
+        return "Enterprise"
+    return None
+
+
+
+def _read_current_version() -> tuple:
+    backend = get_backend()
+    with backend.open_key(HKEY_LOCAL_MACHINE, CURRENT_VERSION_KEY, read=True) as key:
+        product, build = backend.read_values(key, ["ProductName", "CurrentBuildNumber"])
+    return (
+        str(product[0]) if product else None,
+        int(build[0]) if build else None,
+    )
+
+
+
+def _run_probe() -> str:
+    if host_enabled():
+        try:
+            result = get_host().run_command(SYSTEM_PROBE, timeout=PROBE_TIMEOUT)
+        except HostUnavailableError as e:
+            logger.warning(f"PowerShell host unavailable, spawning a process instead: {e}")
+        else:
+            if result.status != 0:
+                raise RuntimeError(result.errors or f"exit code {result.status}")
+            return result.output
+    creationflags = 0
+    if sys.platform == "win32":
+        creationflags = subprocess.CREATE_NEW_PROCESS_GROUP
+        if hasattr(subprocess, "CREATE_NO_WINDOW"):
+            creationflags |= subprocess.CREATE_NO_WINDOW
+    result = subprocess.run(
+        ["powershell.exe", "-NoProfile", "-Command", SYSTEM_PROBE],
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=PROBE_TIMEOUT,
+        creationflags=creationflags,
+    )
+    return result.stdout
+
+
+
+def _collect() -> SystemInfo:
+    try:
+        product_name, build = _read_current_version()
+    except Exception as e:
+        logger.exception(f"Unable to read {CURRENT_VERSION_KEY}: {e}")
+        product_name, build = None, None
+    exclusions = None
+    defender_error = None
+    ps_version = None
+    try:
+        data = json.loads(_run_probe())
+        ps_version = data.get("ps_version")
+        defender_error = data.get("defender_error")
+        if not defender_error:
+            paths = data.get("exclusions") or []
+            if isinstance(paths, str):
+                paths = [paths]
+            exclusions = [os.path.normpath(p).rstrip("\\") for p in paths]
+    except Exception as e:
+        logger.error(f"PowerShell system probe failed: {e}")
+        defender_error = f"PowerShell is not available: {e}"
+    info = SystemInfo(
+        product_name=product_name,
+        build=build,
+        edition=detect_edition(product_name),
+        defender_exclusions=exclusions,
+        defender_error=defender_error,
+        powershell_available=ps_version is not None,
+        powershell_version=ps_version,
+    )
+    logger.info(
+        f"System info: {product_name} (build {build}); edition: {info.edition}; "
+        f"PowerShell {ps_version or 'unavailable'}; "
+        f"{'Defender unknown' if exclusions is None else f'{len(exclusions)} Defender exclusions'}"
+    )
+    return info
+
+
+
+def get_system_info(refresh: bool = False) -> SystemInfo:
+    """Collect the snapshot on first use and share it for the rest of the run."""
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None or refresh:
+            _snapshot = _collect()
+        return _snapshot
+
+
+
+def record_defender_exclusions(paths: Iterable[str]) -> None:
+    """Fold exclusions Talon added itself into the snapshot."""
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.defender_exclusions is None:
+            return
+        current = list(_snapshot.defender_exclusions)
+        known = {p.lower() for p in current}
+        for path in paths:
+            norm = os.path.normpath(path).rstrip("\\")
+            if norm.lower() not in known:
+                current.append(norm)
+                known.add(norm.lower())
+        _snapshot = _snapshot._replace(defender_exclusions=current)
+
+
+
+if __name__ == "__main__":
+    for field, value in get_system_info()._asdict().items():
+        print(f"{field}: {value}")
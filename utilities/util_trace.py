@@ -0,0 +1,105 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+from utilities.util_logger import logger
+
+
+
+_events = []
+_thread_names = {}
+_lock = threading.Lock()
+_enabled = False
+_origin = time.perf_counter()
+
+
+
+def enable_tracing() -> None:
+    global _enabled
+    _enabled = True
+    logger.debug("Span tracing enabled")
+
+
+
+def is_tracing_enabled() -> bool:
+    return _enabled
+
+
+
+def _record(name: str, cat: str, start: float, end: float, attrs: dict) -> None:
+    thread = threading.current_thread()
+    event = {
+        "name": name,
+        "cat": cat,
+        "ph": "X",
+        "ts": round((start - _origin) * 1e6, 3),
+        "dur": round((end - start) * 1e6, 3),
+        "pid": os.getpid(),
+        "tid": thread.ident,
+        "args": {k: str(v) for k, v in attrs.items()},
+    }
+    with _lock:
+        _events.append(event)
+        _thread_names[thread.ident] = thread.name
+
+
+
+@contextmanager
+def span(name: str, cat: str = "talon", **attrs):
+    if not _enabled:
+        yield attrs
+        return
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = repr(e)
+        raise
+    finally:
+        _record(name, cat, start, time.perf_counter(), attrs)
+
+
+
+def traced(name: str, cat: str = "talon", attrs: Optional[Callable[..., dict]] = None):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            extra = {}
+            if attrs is not None:
+                try:
+                    extra = attrs(*args, **kwargs)
+                except Exception:
+                    extra = {}
+            with span(name, cat, **extra):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+
+def write_chrome_trace(path: str) -> bool:
+    with _lock:
+        events = list(_events)
+        names = dict(_thread_names)
+    pid = os.getpid()
+    metadata = [
+        {"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "talon"}}
+    ] + [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": tname}}
+        for tid, tname in names.items()
+    ]
+    try:
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        logger.info(f"Wrote {len(events)} trace spans to {path}")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to write trace file {path}: {e}")
+        return False
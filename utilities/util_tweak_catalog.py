@@ -0,0 +1,245 @@
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+from collections import namedtuple
+from typing import Iterable, List, Optional
+from utilities.util_logger import logger
+from utilities.util_registry_backend import (
+    RegistryOp,
+    REG_SZ,
+    REG_EXPAND_SZ,
+    REG_BINARY,
+    REG_DWORD,
+    REG_MULTI_SZ,
+    REG_QWORD,
+    hive_name,
+    resolve_hive,
+)
+
+
+
+CATALOG_VERSION = 1
+Tweak = namedtuple("Tweak", ["id", "hive", "path", "name", "type", "value", "tags"])
+_TYPE_NAMES = {
+    "REG_SZ": REG_SZ,
+    "REG_EXPAND_SZ": REG_EXPAND_SZ,
+    "REG_BINARY": REG_BINARY,
+    "REG_DWORD": REG_DWORD,
+    "REG_MULTI_SZ": REG_MULTI_SZ,
+    "REG_QWORD": REG_QWORD,
+}
+_TWEAK_FIELDS = {"id", "hive", "path", "name", "type", "value", "tags"}
+_ID_RE = re.compile(r"^[a-z0-9][a-z0-9._-]*$")
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+
+def default_catalog_path() -> str:
+    if getattr(sys, 'frozen', False):
+        base_path = os.path.dirname(sys.executable)
+    else:
+        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_path, 'configs', 'registry_tweaks.json')
+
+
+
+def _selection_path() -> str:
+    temp_dir = os.environ.get('TEMP', tempfile.gettempdir())
+    return os.path.join(temp_dir, 'talon', 'tweak_selection.json')
+
+
+
+def _parse_value(type_name: str, value):
+    """Return the registry value for a catalog value, or raise ValueError."""
+    if type_name in ("REG_SZ", "REG_EXPAND_SZ"):
+        if not isinstance(value, str):
+            raise ValueError("must be a string")
+        return value
+    if type_name in ("REG_DWORD", "REG_QWORD"):
+        limit = 0xFFFFFFFF if type_name == "REG_DWORD" else 0xFFFFFFFFFFFFFFFF
+        if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= limit:
+            raise ValueError(f"must be an integer between 0 and {limit:#x}")
+        return value
+    if type_name == "REG_MULTI_SZ":
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            raise ValueError("must be a list of strings")
+        return list(value)
+    if not isinstance(value, str):
+        raise ValueError("must be a hex string")
+    try:
+        return bytes.fromhex(value.replace(",", " "))
+    except ValueError:
+        raise ValueError("must be a hex string")
+
+
+
+def validate_catalog(data) -> List[Tweak]:
+    """Check the whole catalog and return its tweaks.
+
+    Every problem is collected, so one ValueError lists them all.
+    """
+    if not isinstance(data, dict) or data.get("version") != CATALOG_VERSION:
+        raise ValueError(f"Tweak catalog must be an object with \"version\": {CATALOG_VERSION}")
+    entries = data.get("tweaks")
+    if not isinstance(entries, list):
+        raise ValueError("Tweak catalog must have a 'tweaks' list")
+    errors = []
+    tweaks = []
+    seen_ids = set()
+    seen_targets = {}
+    for position, entry in enumerate(entries):
+        label = f"tweak #{position + 1}"
+        if not isinstance(entry, dict):
+            errors.append(f"{label}: must be an object")
+            continue
+        label = f"tweak {entry.get('id', '#' + str(position + 1))!s}"
+        missing = _TWEAK_FIELDS - set(entry)
+        unknown = set(entry) - _TWEAK_FIELDS
+        if missing:
+            errors.append(f"{label}: missing {', '.join(sorted(missing))}")
+        if unknown:
+            errors.append(f"{label}: unknown fields {', '.join(sorted(unknown))}")
+        if missing:
+            continue
+        problems = []
+        tweak_id = entry["id"]
+        if not isinstance(tweak_id, str) or not _ID_RE.match(tweak_id):
+            problems.append("id must be lowercase letters, digits, '.', '_' or '-'")
+        elif tweak_id in seen_ids:
+            problems.append("duplicate id")
+        try:
+            hive = hive_name(resolve_hive(entry["hive"])) if isinstance(entry["hive"], str) else None
+        except ValueError:
+            hive = None
+        if hive is None:
+            problems.append(f"unknown hive {entry['hive']!r}")
+        path, name = entry["path"], entry["name"]
+        if not isinstance(path, str) or not path.strip("\\"):
+            problems.append("path must be a non-empty string")
+        if not isinstance(name, str):
+            problems.append("name must be a string")
+        type_name = entry["type"]
+        value = None
+        if type_name not in _TYPE_NAMES:
+            problems.append(f"type must be one of {', '.join(_TYPE_NAMES)}")
+        else:
+            try:
+                value = _parse_value(type_name, entry["value"])
+            except ValueError as e:
+                problems.append(f"value {e} for {type_name}")
+        tags = entry["tags"]
+        if not isinstance(tags, list) or not all(isinstance(t, str) and t for t in tags):
+            problems.append("tags must be a list of non-empty strings")
+        if not problems:
+            target = (hive, path.strip("\\").lower(), name.lower())
+            if target in seen_targets:
+                problems.append(f"writes the same value as tweak {seen_targets[target]}")
+            seen_targets[target] = tweak_id
+        if problems:
+            errors.extend(f"{label}: {p}" for p in problems)
+            continue
+        seen_ids.add(tweak_id)
+        tweaks.append(Tweak(
+            tweak_id, hive, path.strip("\\"), name, _TYPE_NAMES[type_name], value, tuple(tags)
+        ))
+    if errors:
+        raise ValueError("Invalid tweak catalog:\n" + "\n".join(errors))
+    return tweaks
+
+
+
+class TweakCatalog:
+    """Validated tweaks with a (hive, key path) index and a tag index."""
+
+    def __init__(self, tweaks: Iterable[Tweak], source: Optional[str] = None):
+        self.source = source
+        self.tweaks = list(tweaks)
+        self.by_id = {t.id: t for t in self.tweaks}
+        self.index = {}
+        self.tags = {}
+        for tweak in self.tweaks:
+            key = (resolve_hive(tweak.hive), tweak.path.lower())
+            self.index.setdefault(key, []).append(tweak)
+            for tag in tweak.tags:
+                self.tags.setdefault(tag, []).append(tweak)
+
+    def __len__(self):
+        return len(self.tweaks)
+
+    def select(self, tags: Optional[Iterable[str]] = None, exclude_tags: Iterable[str] = ()) -> List[Tweak]:
+        """Tweaks carrying any of tags (all tweaks when tags is None), minus excluded tags."""
+        exclude = set(exclude_tags)
+        unknown = [t for t in list(tags or []) + list(exclude) if t not in self.tags]
+        if unknown:
+            raise ValueError(f"Unknown tweak tags: {', '.join(sorted(set(unknown)))}")
+        wanted = None if tags is None else set(tags)
+        return [
+            t for t in self.tweaks
+            if (wanted is None or wanted.intersection(t.tags)) and not exclude.intersection(t.tags)
+        ]
+
+    def to_ops(self, tweaks: Optional[Iterable[Tweak]] = None) -> List[RegistryOp]:
+        """RegistryOps ordered key by key, following the index."""
+        chosen = None if tweaks is None else {t.id for t in tweaks}
+        return [
+            RegistryOp(t.hive, t.path, t.name, t.value, t.type)
+            for group in self.index.values()
+            for t in group
+            if chosen is None or t.id in chosen
+        ]
+
+
+
+def load_catalog(path: Optional[str] = None) -> TweakCatalog:
+    """Load and validate a catalog once per file version."""
+    path = os.path.abspath(path or default_catalog_path())
+    mtime = os.path.getmtime(path)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        data = json.load(f)
+    catalog = TweakCatalog(validate_catalog(data), path)
+    logger.info(f"Loaded {len(catalog)} tweaks from {path} ({len(catalog.index)} keys, {len(catalog.tags)} tags)")
+    with _cache_lock:
+        _cache[path] = (mtime, catalog)
+    return catalog
+
+
+
+def save_tweak_selection(
+    tags: Optional[List[str]],
+    exclude_tags: Iterable[str] = (),
+    reapply_drift: bool = False,
+) -> str:
+    path = _selection_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'tags': tags, 'exclude_tags': list(exclude_tags), 'reapply_drift': reapply_drift}, f)
+    return path
+
+
+
+def load_tweak_selection() -> tuple:
+    """Return (tags, exclude_tags, reapply_drift) saved for this run."""
+    try:
+        with open(_selection_path(), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('tags'), data.get('exclude_tags') or [], bool(data.get('reapply_drift'))
+    except FileNotFoundError:
+        return None, [], False
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable tweak selection: {e}")
+        return None, [], False
+
+
+
+if __name__ == "__main__":
+    catalog = load_catalog(sys.argv[1] if len(sys.argv) > 1 else None)
+    for tag, tweaks in sorted(catalog.tags.items()):
+        print(f"{tag}: {', '.join(t.id for t in tweaks)}")
@@ -1,22 +1,7 @@
 import sys
-import winreg
 from utilities.util_logger import logger
 from utilities.util_error_popup import show_error_popup
-
-
-
-def _read_registry_value(name: str) -> str:
-    key_path = r"SOFTWARE\Microsoft\Windows NT\CurrentVersion"
-    access = winreg.KEY_READ
-    if hasattr(winreg, "KEY_WOW64_64KEY"):
-        access |= winreg.KEY_WOW64_64KEY
-    try:
-        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, key_path, 0, access) as key:
-            val, _ = winreg.QueryValueEx(key, name)
-        return str(val)
-    except Exception as e:
-        logger.exception(f"Unable to read registry value {name}: {e}")
-        raise
+from utilities.util_system_info import get_system_info
 
 
 
@@ -27,11 +12,10 @@ def check_windows_11_home_or_pro() -> str:
             "This tool requires Windows 11 Home or Professional.",
             allow_continue=False
         )
-    try:
-        product_name = _read_registry_value("ProductName")
-        build_str    = _read_registry_value("CurrentBuildNumber")
-        build_num    = int(build_str)
-    except Exception:
+    info = get_system_info()
+    product_name = info.product_name
+    build_num = info.build
+    if product_name is None or build_num is None:
         show_error_popup(
             "Failed to determine Windows version.\n"
             "This tool requires Windows 11 Home or Professional.",
@@ -48,11 +32,8 @@ def check_windows_11_home_or_pro() -> str:
             "This tool requires Windows 11 Home or Professional.",
             allow_continue=False
         )
-    if "Home" in product_name:
-        edition = "Home"
-    elif "Professional" in product_name or "Pro" in product_name:
-        edition = "Professional"
-    else:
+    edition = info.edition
+    if edition not in ("Home", "Professional"):
         show_error_popup(
             f"Unsupported Windows 11 edition detected:\n"
             f"  {product_name}\n"